@@ -1,74 +1,103 @@
 """
 Check if any entries in the NMR database contain Boron (B)
+Usage: python check_boron.py [max_entries] [--summary]
 """
 
 import sys
+from nmrshiftdb_reader import iter_lines
 
+# Report separator, built once rather than per printed entry
+SEPARATOR = "=" * 80
 
-def check_for_boron(max_entries=None):
-    """
-    Search the entire database for entries containing Boron
+# Underscore-separated fields per CSV row
+FIELD_COUNT = 7
 
-    Returns:
-        List of entries containing boron
+
+def iter_boron_entries(max_entries=None):
     """
-    print("Searching NMR database for Boron-containing entries...")
-    print("=" * 80)
+    Stream the database entries containing Boron
 
-    boron_entries = []
+    Lines are matched as raw bytes and only the rare hits are decoded, so
+    nothing is accumulated for the ~99% of lines without Boron.
+
+    Yields:
+        (line_number, full_entry, hose_code) tuples
+    """
     total_checked = 0
 
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        for line_num, line in enumerate(f, 1):
-            line = line.strip()
-            if not line:
-                continue
+    for line_num, raw_line in enumerate(iter_lines("nmrshiftdb2/nmrshiftdb.csv"), 1):
+        line = raw_line.strip()
+        if not line:
+            continue
 
-            total_checked += 1
+        total_checked += 1
 
-            # Check if line contains 'B' in HOSE code
+        # Cheap memchr pre-filter before any split: the HOSE code always
+        # follows the first ';', so lines without a 'B' after it (nearly all,
+        # including 'B' in solvent names like Benzene) are skipped outright
+        if line.find(b"B", line.find(b";") + 1) != -1:
             # Need to be careful - 'B' could be in solvent names, etc.
-            # So we look specifically in the structure/HOSE code part
-
-            parts = line.split("_")
+            # So we look specifically in the structure/HOSE code part.
+            # Only the first three fields matter, so stop splitting there.
+            parts = line.split(b"_", 3)
             if len(parts) >= 3:
                 structure = parts[2]  # The structure/HOSE code part
 
                 # Extract HOSE code
-                if ";" in structure:
-                    hose_code = structure.split(";")[1] if len(structure.split(";")) > 1 else ""
+                if b";" in structure:
+                    hose_code = structure.split(b";", 2)[1]
                 else:
                     hose_code = structure
 
-                # Check for Boron in HOSE code
-                if "B" in hose_code:
-                    boron_entries.append(
-                        {
-                            "line_number": line_num,
-                            "full_entry": line,
-                            "hose_code": hose_code,
-                        }
-                    )
-
-                    # Print as we find them
-                    print(f"\nFound Boron entry #{len(boron_entries)} (line {line_num}):")
-                    print(f"  Full entry: {line[:100]}...")
-                    print(f"  HOSE code: {hose_code[:80]}...")
-
-            # Progress update
-            if total_checked % 100000 == 0:
-                print(f"\rChecked {total_checked:,} entries...", end="", flush=True)
-
-            # Stop if we've checked enough
-            if max_entries and total_checked >= max_entries:
-                break
-
-    print(f"\n\n" + "=" * 80)
+                # Check for Boron in HOSE code (decode only the rare matches)
+                if b"B" in hose_code:
+                    yield line_num, line.decode("utf-8"), hose_code.decode("utf-8")
+
+        # Progress update
+        if total_checked % 100000 == 0:
+            print(f"\rChecked {total_checked:,} entries...", end="", flush=True)
+
+        # Stop if we've checked enough
+        if max_entries and total_checked >= max_entries:
+            break
+
+    print(f"\n\n" + SEPARATOR)
     print(f"Search complete!")
     print(f"Total entries checked: {total_checked:,}")
-    print(f"Entries containing Boron: {len(boron_entries)}")
 
-    return boron_entries
+
+def check_for_boron(max_entries=None, keep_entries=True):
+    """
+    Search the entire database for entries containing Boron
+
+    Args:
+        max_entries: Stop after this many entries (default: whole database)
+        keep_entries: Collect every match for detailed analysis. When False,
+            only the first 10 matches are kept for the summary.
+
+    Returns:
+        (entries, total_found) where entries is a list of
+        (line_number, full_entry, hose_code) tuples
+    """
+    print("Searching NMR database for Boron-containing entries...")
+    print(SEPARATOR)
+
+    boron_entries = []
+    total_found = 0
+
+    for line_num, full_entry, hose_code in iter_boron_entries(max_entries):
+        total_found += 1
+        if keep_entries or total_found <= 10:
+            boron_entries.append((line_num, full_entry, hose_code))
+
+        # Print as we find them
+        print(f"\nFound Boron entry #{total_found} (line {line_num}):")
+        print(f"  Full entry: {full_entry[:100]}...")
+        print(f"  HOSE code: {hose_code[:80]}...")
+
+    print(f"Entries containing Boron: {total_found}")
+
+    return boron_entries, total_found
 
 
 def analyze_boron_entries(entries):
@@ -77,78 +106,80 @@ def analyze_boron_entries(entries):
         print("\nNo boron entries found.")
         return
 
-    print("\n" + "=" * 80)
+    print("\n" + SEPARATOR)
     print("DETAILED ANALYSIS OF BORON ENTRIES")
-    print("=" * 80)
+    print(SEPARATOR)
 
-    for idx, entry in enumerate(entries, 1):
-        print(f"\n{'='*80}")
+    for idx, (line_number, full_entry, hose_code) in enumerate(entries, 1):
+        print(f"\n{SEPARATOR}")
         print(f"Boron Entry #{idx}")
-        print(f"{'='*80}")
-        print(f"Line number: {entry['line_number']}")
+        print(SEPARATOR)
+        print(f"Line number: {line_number}")
         print(f"\nFull entry:")
-        print(f"  {entry['full_entry']}")
+        print(f"  {full_entry}")
 
         # Parse the entry
-        parts = entry["full_entry"].split("_")
-        if len(parts) >= 4:
+        parts = full_entry.split("_")
+        if len(parts) >= FIELD_COUNT:
             solvent = parts[0]
             nucleus = parts[1]
             structure = parts[2]
 
-            # Try to extract shift data
+            # Try to extract shift data (fixed offsets after the structure)
             try:
-                shift_parts = parts[3:]
-                shift_str = "_".join(shift_parts)
-                shift_values = shift_str.split("_")
-
-                if len(shift_values) >= 4:
-                    min_shift = float(shift_values[0])
-                    max_shift = float(shift_values[1])
-                    avg_shift = float(shift_values[2])
-                    count = int(shift_values[3])
-
-                    print(f"\nParsed data:")
-                    print(f"  Solvent: {solvent}")
-                    print(f"  Nucleus: {nucleus}")
-                    print(f"  Structure: {structure}")
-                    print(f"  Chemical shift: {avg_shift} ppm (range: {min_shift}-{max_shift})")
-                    print(f"  Number of measurements: {count}")
+                min_shift = float(parts[3])
+                max_shift = float(parts[4])
+                avg_shift = float(parts[5])
+                count = int(parts[6])
+
+                print(f"\nParsed data:")
+                print(f"  Solvent: {solvent}")
+                print(f"  Nucleus: {nucleus}")
+                print(f"  Structure: {structure}")
+                print(f"  Chemical shift: {avg_shift} ppm (range: {min_shift}-{max_shift})")
+                print(f"  Number of measurements: {count}")
             except Exception as e:
                 print(f"\n  Could not parse shift data: {e}")
 
-        print(f"\nHOSE code: {entry['hose_code']}")
+        print(f"\nHOSE code: {hose_code}")
 
         # Count boron atoms
-        boron_count = entry["hose_code"].count("B")
+        boron_count = hose_code.count("B")
         print(f"Boron occurrences in HOSE code: {boron_count}")
 
 
 if __name__ == "__main__":
     # Check command line arguments
-    if len(sys.argv) > 1:
-        max_entries = int(sys.argv[1])
+    # --summary skips the detailed analysis and does not keep every match
+    args = [arg for arg in sys.argv[1:] if arg != "--summary"]
+    summary_only = len(args) != len(sys.argv) - 1
+
+    if args:
+        max_entries = int(args[0])
         print(f"Checking first {max_entries:,} entries...\n")
     else:
         max_entries = None
         print("Checking entire database...\n")
 
     # Search for boron
-    boron_entries = check_for_boron(max_entries=max_entries)
+    boron_entries, total_found = check_for_boron(
+        max_entries=max_entries, keep_entries=not summary_only
+    )
 
     # Analyze findings
-    analyze_boron_entries(boron_entries)
+    if not summary_only:
+        analyze_boron_entries(boron_entries)
 
     # Summary
-    print("\n" + "=" * 80)
+    print("\n" + SEPARATOR)
     print("SUMMARY")
-    print("=" * 80)
-    if boron_entries:
-        print(f"✓ Found {len(boron_entries)} entries containing Boron!")
+    print(SEPARATOR)
+    if total_found:
+        print(f"✓ Found {total_found} entries containing Boron!")
         print(f"\nBoron-containing entries are at lines:")
-        for entry in boron_entries[:10]:  # Show first 10
-            print(f"  - Line {entry['line_number']}")
-        if len(boron_entries) > 10:
-            print(f"  ... and {len(boron_entries) - 10} more")
+        for line_number, _, _ in boron_entries[:10]:  # Show first 10
+            print(f"  - Line {line_number}")
+        if total_found > 10:
+            print(f"  ... and {total_found - 10} more")
     else:
         print("✗ No Boron-containing entries found in the database.")
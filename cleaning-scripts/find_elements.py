@@ -3,9 +3,50 @@ Find all chemical elements present in the NMR database
 Scans HOSE codes to identify all atoms
 """
 
+import os
+import re
 import sys
 from collections import Counter
+from functools import partial
 from tqdm import tqdm
+from nmrshiftdb_reader import (
+    iter_lines,
+    load_sidecar,
+    map_line_ranges,
+    save_sidecar,
+    split_line_ranges,
+)
+
+DB_PATH = "nmrshiftdb2/nmrshiftdb.csv"
+
+# Bump when the scan's results change so stale pickle sidecars are ignored
+CACHE_VERSION = 1
+
+# Byte ranges per worker process (more ranges = smoother progress)
+SCAN_RANGES_PER_WORKER = 4
+
+
+# Element symbols recognized in HOSE codes, split by length so a two-letter
+# symbol is tried first (e.g., Cl before C)
+TWO_LETTER_ELEMENTS = frozenset([
+    'Cl', 'Br', 'Si', 'Se', 'Sn', 'Pb', 'Bi',
+    'Al', 'As', 'Au', 'Ag', 'Ca', 'Cd', 'Co', 'Cr', 'Cu',
+    'Fe', 'Ga', 'Ge', 'Hg', 'Li', 'Mg', 'Mn', 'Mo', 'Na',
+    'Ni', 'Pt', 'Rb', 'Re', 'Ru', 'Sb', 'Sc', 'Sr', 'Te',
+    'Ti', 'Tl', 'Zn', 'Zr'
+])
+ONE_LETTER_ELEMENTS = frozenset([
+    'C', 'H', 'O', 'N', 'S', 'P', 'F', 'B', 'I',  # Single-letter common
+    'K', 'V', 'W', 'X', 'Y', 'Z', 'Q',  # Other single letters
+])
+
+# One compiled scanner over both tables: alternatives are tried in order at
+# each position, so listing the two-letter symbols first keeps the longest
+# match, and characters that start no symbol are skipped inside the C engine
+ELEMENT_PATTERN = re.compile(
+    "|".join(sorted(TWO_LETTER_ELEMENTS))
+    + "|[" + "".join(sorted(ONE_LETTER_ELEMENTS)) + "]"
+)
 
 
 def extract_elements_from_hose(hose_code):
@@ -15,92 +56,119 @@ def extract_elements_from_hose(hose_code):
     Returns:
         set of element symbols found
     """
-    elements = set()
-
-    # List of possible elements (ordered by length for proper matching)
-    # Two-letter elements first to avoid confusion (e.g., Cl before C)
-    element_list = [
-        'Cl', 'Br', 'Si', 'Se', 'Sn', 'Pb', 'Bi',  # Two-letter elements
-        'C', 'H', 'O', 'N', 'S', 'P', 'F', 'B', 'I',  # Single-letter common
-        'K', 'V', 'W', 'X', 'Y', 'Z', 'Q',  # Other single letters
-        'Al', 'As', 'Au', 'Ag', 'Ca', 'Cd', 'Co', 'Cr', 'Cu',  # More two-letter
-        'Fe', 'Ga', 'Ge', 'Hg', 'Li', 'Mg', 'Mn', 'Mo', 'Na',
-        'Ni', 'Pt', 'Rb', 'Re', 'Ru', 'Sb', 'Sc', 'Sr', 'Te',
-        'Ti', 'Tl', 'Zn', 'Zr'
-    ]
-
-    i = 0
-    while i < len(hose_code):
-        # Try two-letter elements first
-        if i + 1 < len(hose_code):
-            two_char = hose_code[i:i+2]
-            if two_char in element_list:
-                elements.add(two_char)
-                i += 2
-                continue
-
-        # Try single-letter elements
-        one_char = hose_code[i]
-        if one_char in element_list:
-            elements.add(one_char)
-            i += 1
-        else:
-            i += 1
-
-    return elements
+    # Without a lowercase letter no two-letter symbol can occur, so the
+    # result is just the one-letter symbols present (a C-level set op)
+    if hose_code.isupper():
+        return set(hose_code) & ONE_LETTER_ELEMENTS
+    return set(ELEMENT_PATTERN.findall(hose_code))
 
 
-def find_all_elements(max_entries=None):
+def _scan_range(byte_range, max_lines=None):
     """
-    Scan the entire database and find all elements
+    Count the elements in the CSV lines of one byte range (runs in a worker process)
 
     Returns:
-        Counter object with element frequencies
+        (element_counter, total_entries, entries_with_elements)
     """
-    print("Scanning NMR database for chemical elements...")
-    print("=" * 80)
+    element_counter = Counter()
+    total_entries = 0
+    entries_with_elements = 0
+
+    for idx, line in enumerate(iter_lines(DB_PATH, *byte_range)):
+        if max_lines and idx >= max_lines:
+            break
+
+        line = line.strip()
+        if not line:
+            continue
+
+        total_entries += 1
+
+        # Extract HOSE code from the line (only the first three fields
+        # are needed, so stop splitting there); the line stays bytes and
+        # only the HOSE code is decoded
+        parts = line.split(b"_", 3)
+        if len(parts) >= 3:
+            structure = parts[2]
+
+            # Extract HOSE code (second ';'-separated field, splitting once)
+            if b";" in structure:
+                hose_code = structure.split(b";", 2)[1]
+            else:
+                hose_code = structure
+
+            # Find elements in this HOSE code
+            elements = extract_elements_from_hose(hose_code.decode("utf-8"))
+
+            if elements:
+                entries_with_elements += 1
+                for elem in elements:
+                    element_counter[elem] += 1
+
+    return element_counter, total_entries, entries_with_elements
 
+
+def _scan_database(max_entries=None):
+    """
+    Scan the CSV for elements
+
+    A full scan splits the file into newline-aligned byte ranges, scans them
+    in a multiprocessing pool and merges the per-range counters in file
+    order; a max_entries prefix (or a single-CPU machine) is scanned inline.
+
+    Returns:
+        (element_counter, total_entries, entries_with_elements)
+    """
     element_counter = Counter()
     total_entries = 0
     entries_with_elements = 0
 
-    # Count total lines for progress bar
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        total_lines = sum(1 for _ in f)
+    # Track progress in bytes so the file is only read once
+    pbar = tqdm(total=os.path.getsize(DB_PATH), unit="B", unit_scale=True, desc="Scanning entries")
 
-    if max_entries:
-        total_lines = min(total_lines, max_entries)
+    num_ranges = 1 if max_entries else (os.cpu_count() or 1) * SCAN_RANGES_PER_WORKER
+    byte_ranges = split_line_ranges(DB_PATH, num_ranges)
+    scan = partial(_scan_range, max_lines=max_entries)
 
-    # Scan database
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        for line_num, line in enumerate(tqdm(f, total=total_lines, desc="Scanning entries"), 1):
-            if max_entries and line_num > max_entries:
-                break
+    with map_line_ranges(scan, byte_ranges, parallel=not max_entries) as results:
+        for (start, end), (range_counter, range_entries, range_with_elements) in zip(
+            byte_ranges, results
+        ):
+            element_counter.update(range_counter)
+            total_entries += range_entries
+            entries_with_elements += range_with_elements
+            pbar.update(end - start)
+    pbar.close()
 
-            line = line.strip()
-            if not line:
-                continue
+    return element_counter, total_entries, entries_with_elements
 
-            total_entries += 1
 
-            # Extract HOSE code from the line
-            parts = line.split("_")
-            if len(parts) >= 3:
-                structure = parts[2]
+def find_all_elements(max_entries=None):
+    """
+    Scan the entire database and find all elements
 
-                # Extract HOSE code (after semicolon)
-                if ";" in structure:
-                    hose_code = structure.split(";")[1] if len(structure.split(";")) > 1 else ""
-                else:
-                    hose_code = structure
+    The scan result is cached in nmrshiftdb2/nmrshiftdb.elements.pickle and
+    reused until the CSV changes, so only the first run parses the file.
 
-                # Find elements in this HOSE code
-                elements = extract_elements_from_hose(hose_code)
+    Returns:
+        Counter object with element frequencies
+    """
+    print("Scanning NMR database for chemical elements...")
+    print("=" * 80)
 
-                if elements:
-                    entries_with_elements += 1
-                    for elem in elements:
-                        element_counter[elem] += 1
+    cache_key = (CACHE_VERSION, max_entries)
+    cached = load_sidecar(DB_PATH, "elements", key=cache_key)
+    if cached is not None:
+        element_counter, total_entries, entries_with_elements = cached
+        print("Loaded element counts from cache")
+    else:
+        element_counter, total_entries, entries_with_elements = _scan_database(max_entries)
+        save_sidecar(
+            DB_PATH,
+            "elements",
+            (element_counter, total_entries, entries_with_elements),
+            key=cache_key,
+        )
 
     print(f"\n{'='*80}")
     print("Scan complete!")
@@ -3,194 +3,404 @@ Find entries with 100% overlapping chemical shift ranges
 These are problematic because we can't distinguish between them based on shift alone
 """
 
+import mmap
+import os
 import sys
 from collections import defaultdict
+from dataclasses import dataclass
+from functools import partial
+import numpy as np
 from tqdm import tqdm
 from hose_decoder import describe_environment
+from nmrshiftdb_reader import (
+    iter_lines,
+    load_sidecar,
+    map_line_ranges,
+    save_sidecar,
+    split_line_ranges,
+)
 
+DB_PATH = "nmrshiftdb2/nmrshiftdb.csv"
 
-def ranges_overlap_100_percent(range1, range2):
-    """
-    Check if two ranges have 100% overlap
-    This means one range is completely contained within the other (or they're identical)
+# Bump when the parsed layout changes so stale pickle sidecars are ignored
+CACHE_VERSION = 4
 
-    Args:
-        range1: tuple (min1, max1)
-        range2: tuple (min2, max2)
+# Underscore-separated fields per CSV row
+FIELD_COUNT = 7
 
-    Returns:
-        True if one range completely contains the other
+# Numeric columns of the parsed database, stored as NumPy arrays
+NUMERIC_COLUMNS = ("line_number", "min_shift", "max_shift", "avg_shift", "count")
+
+# Byte ranges per worker process when parsing (more ranges = smoother progress)
+PARSE_RANGES_PER_WORKER = 4
+
+# Rows per block in the vectorized overlap sweep
+TILE_SIZE = 4096
+
+
+@dataclass(slots=True, frozen=True)
+class Entry:
     """
-    min1, max1 = range1
-    min2, max2 = range2
+    Text fields of one parsed row; the numeric fields live in the NumPy columns
 
-    # Check if range1 completely contains range2
-    if min1 <= min2 and max1 >= max2:
-        return True
+    The full CSV line is not stored: offset/length locate it in the file so
+    full_entry can slice it out of a memory map when a report needs it.
+    """
+    solvent: str
+    nucleus: str
+    hose_code: str
+    offset: int
+    length: int
+
+    def full_entry(self, mm):
+        """Read this entry's full CSV line from a memory map of the database"""
+        return mm[self.offset:self.offset + self.length].strip().decode("utf-8")
 
-    # Check if range2 completely contains range1
-    if min2 <= min1 and max2 >= max1:
-        return True
 
-    return False
+def _parse_range(byte_range, max_lines=None):
+    """
+    Parse the CSV lines in one byte range (runs in a worker process)
+
+    Numeric fields go into typed NumPy columns; only the text needed for
+    reporting is kept per entry, as an Entry. Line numbers are relative to
+    the start of the range; the caller shifts them by the number of lines in
+    the preceding ranges.
+
+    Returns:
+        (columns, entries, errors, lines_read) where columns maps each name
+        in NUMERIC_COLUMNS to an array and entries is a parallel list of Entry
+    """
+    start, end = byte_range
+    line_numbers = []
+    mins = []
+    maxs = []
+    avgs = []
+    counts = []
+    entries = []
+    errors = 0
+    lines_read = 0
+    offset = start
+
+    for idx, raw_line in enumerate(iter_lines(DB_PATH, start, end)):
+        if max_lines and idx >= max_lines:
+            break
+
+        lines_read += 1
+        line_offset = offset
+        offset += len(raw_line) + 1
+
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        try:
+            # Fields: solvent_nucleus_structure_min_max_avg_count. The schema
+            # is fixed, so stop after the sixth separator; only rows with
+            # extra underscores fall back to a full split.
+            parts = line.split(b"_", FIELD_COUNT - 1)
+            if len(parts) == FIELD_COUNT and b"_" in parts[-1]:
+                parts = line.split(b"_")
+            if len(parts) >= FIELD_COUNT:
+                solvent = parts[0].decode("utf-8")
+                nucleus = parts[1].decode("utf-8")
+                structure = parts[2].decode("utf-8")
+
+                # Chemical shifts sit at fixed offsets after the structure
+                min_shift = float(parts[3])
+                max_shift = float(parts[4])
+                avg_shift = float(parts[5])
+                count = int(parts[6])
+
+                # Extract HOSE code (second ';'-separated field), splitting once
+                structure_fields = structure.split(";", 2)
+                hose_code = structure_fields[1] if len(structure_fields) > 1 else ""
+
+                line_numbers.append(idx + 1)
+                mins.append(min_shift)
+                maxs.append(max_shift)
+                avgs.append(avg_shift)
+                counts.append(count)
+                entries.append(Entry(solvent, nucleus, hose_code, line_offset, len(raw_line)))
+        except Exception as e:
+            errors += 1
+            continue
+
+    columns = {
+        "line_number": np.array(line_numbers, dtype=np.int64),
+        "min_shift": np.array(mins, dtype=np.float64),
+        "max_shift": np.array(maxs, dtype=np.float64),
+        "avg_shift": np.array(avgs, dtype=np.float64),
+        "count": np.array(counts, dtype=np.int32),
+    }
+    return columns, entries, errors, lines_read
 
 
 def load_and_parse_database(max_entries=None):
-    """Load and parse the NMR database with progress bar"""
+    """
+    Load and parse the NMR database with progress bar
+
+    Returns:
+        Dict of parallel columns: a NumPy array for each name in
+        NUMERIC_COLUMNS plus "entries", a list of Entry holding the text
+        fields. Entries are addressed by their index into these columns.
+        "representatives" and "range_class" hold the duplicate-range map
+        from dedup_ranges.
+
+    The parsed entries are cached in nmrshiftdb2/nmrshiftdb.overlaps.pickle and
+    reused until the CSV changes, so only the first run pays for parsing.
+
+    A full parse splits the file into newline-aligned byte ranges and parses
+    them in a multiprocessing pool; a max_entries prefix (or a single-CPU
+    machine) is parsed inline.
+    """
     print("Loading NMR database...")
 
+    cache_key = (CACHE_VERSION, max_entries)
+    cached = load_sidecar(DB_PATH, "overlaps", key=cache_key)
+    if cached is not None:
+        db, errors = cached
+        print("Loaded parsed entries from cache")
+        print(f"\nSuccessfully parsed: {len(db['entries']):,} entries")
+        print(f"Parsing errors: {errors:,}")
+        return db
+
+    parsed_columns = {name: [] for name in NUMERIC_COLUMNS}
     entries = []
     errors = 0
 
-    # First count total lines for progress bar
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        total_lines = sum(1 for _ in f)
+    # Track progress in bytes so the file is only read once
+    pbar = tqdm(total=os.path.getsize(DB_PATH), unit="B", unit_scale=True, desc="Parsing entries")
+
+    num_ranges = 1 if max_entries else (os.cpu_count() or 1) * PARSE_RANGES_PER_WORKER
+    byte_ranges = split_line_ranges(DB_PATH, num_ranges)
+    parse = partial(_parse_range, max_lines=max_entries)
+
+    line_offset = 0
+    with map_line_ranges(parse, byte_ranges, parallel=not max_entries) as results:
+        for (start, end), (columns, range_entries, range_errors, lines_read) in zip(
+            byte_ranges, results
+        ):
+            columns["line_number"] += line_offset
+            for name in NUMERIC_COLUMNS:
+                parsed_columns[name].append(columns[name])
+            entries.extend(range_entries)
+            errors += range_errors
+            line_offset += lines_read
+            pbar.update(end - start)
+    pbar.close()
+
+    if byte_ranges:
+        db = {name: np.concatenate(parsed_columns[name]) for name in NUMERIC_COLUMNS}
+    else:
+        # An empty CSV has no ranges; an empty range yields empty columns of
+        # the parsed dtypes
+        db = _parse_range((0, 0))[0]
+    db["entries"] = entries
+    db["representatives"], db["range_class"] = dedup_ranges(db["min_shift"], db["max_shift"])
 
-    if max_entries:
-        total_lines = min(total_lines, max_entries)
-
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        for idx, line in enumerate(tqdm(f, total=total_lines, desc="Parsing entries")):
-            if max_entries and idx >= max_entries:
-                break
-
-            line = line.strip()
-            if not line:
-                continue
-
-            try:
-                parts = line.split("_")
-                if len(parts) >= 4:
-                    solvent = parts[0]
-                    nucleus = parts[1]
-                    structure = parts[2]
-
-                    # Extract chemical shifts
-                    shift_parts = parts[3:]
-                    shift_str = "_".join(shift_parts)
-                    shift_values = shift_str.split("_")
-
-                    if len(shift_values) >= 4:
-                        min_shift = float(shift_values[0])
-                        max_shift = float(shift_values[1])
-                        avg_shift = float(shift_values[2])
-                        count = int(shift_values[3])
-
-                        # Extract HOSE code
-                        hose_code = ""
-                        if ";" in structure:
-                            hose_code = structure.split(";")[1] if len(structure.split(";")) > 1 else ""
-
-                        entries.append({
-                            "line_number": idx + 1,
-                            "full_entry": line,
-                            "solvent": solvent,
-                            "nucleus": nucleus,
-                            "structure": structure,
-                            "hose_code": hose_code,
-                            "min_shift": min_shift,
-                            "max_shift": max_shift,
-                            "avg_shift": avg_shift,
-                            "count": count,
-                        })
-            except Exception as e:
-                errors += 1
-                continue
+    save_sidecar(DB_PATH, "overlaps", (db, errors), key=cache_key)
 
     print(f"\nSuccessfully parsed: {len(entries):,} entries")
     print(f"Parsing errors: {errors:,}")
 
-    return entries
+    return db
+
+
+def dedup_ranges(mins, maxs):
+    """
+    Collapse entries with identical (min_shift, max_shift) ranges
+
+    Identical ranges contain each other and overlap exactly the same other
+    entries, so the sweep only needs one representative per distinct range;
+    expand_duplicates maps its groups back to every entry.
+
+    Returns:
+        (representatives, range_class) where representatives holds one entry
+        index per distinct range and range_class maps each entry to the
+        position of its range in representatives
+    """
+    _, representatives, range_class = np.unique(
+        np.column_stack((mins, maxs)), axis=0, return_index=True, return_inverse=True
+    )
+    return representatives, range_class.reshape(-1)
+
+
+def _ragged_arange(starts, counts):
+    """
+    Concatenate arange(starts[k], starts[k] + counts[k]) for every k, vectorized
+    """
+    total = int(counts.sum())
+    offsets = np.repeat(starts - (np.cumsum(counts) - counts), counts)
+    return np.arange(total, dtype=np.int64) + offsets
 
 
-def find_overlapping_ranges(entries, tolerance=0.0):
+def find_overlapping_ranges(mins, maxs, tolerance=0.0):
     """
     Find all pairs of entries with 100% overlapping ranges
 
+    Uses a sweep over the entries sorted by (min_shift, -max_shift): every
+    entry already visited starts at or below the current one, so it contains
+    the current range exactly when its max_shift is >= the current max_shift.
+
+    The shifts are NumPy arrays (one per field) and the sweep runs a
+    tile of TILE_SIZE entries at a time: containers from earlier tiles are
+    found with np.searchsorted against the sorted max_shift values seen so
+    far, and containers within the tile come from a broadcasted comparison.
+
     Args:
-        entries: List of database entries
+        mins: Array of min_shift values, one per entry
+        maxs: Array of max_shift values, one per entry
         tolerance: Additional tolerance in ppm (default: 0.0 for exact overlaps)
 
-    Returns:
-        List of overlapping groups
+    Yields:
+        (i, j) entry index pairs with i < j, a tile at a time, so the pairs
+        can be consumed without ever holding the full list in memory
     """
     print(f"\nSearching for overlapping ranges (tolerance: {tolerance} ppm)...")
 
-    overlaps = []
+    n = len(mins)
+
+    # Widen every range once up front; after sorting, the containment test
+    # reduces to a single max_shift comparison per candidate pair
+    mins = mins - tolerance
+    maxs = maxs + tolerance
+
+    # Primary key min_shift ascending, secondary max_shift descending
+    order = np.lexsort((-maxs, mins))
+    sorted_maxs = maxs[order]
+
+    # max_shift of every visited entry in ascending order, with entry indices
+    seen_maxs = np.empty(0, dtype=np.float64)
+    seen_idx = np.empty(0, dtype=np.int64)
+
+    for start in tqdm(range(0, n, TILE_SIZE), desc="Finding overlaps"):
+        tile = order[start:start + TILE_SIZE]
+        tile_maxs = sorted_maxs[start:start + TILE_SIZE]
 
-    # Compare all pairs
-    for i in tqdm(range(len(entries)), desc="Finding overlaps"):
-        entry1 = entries[i]
-        range1 = (entry1["min_shift"] - tolerance, entry1["max_shift"] + tolerance)
+        # Containers from earlier tiles: the suffix of seen_maxs >= tile max
+        first = np.searchsorted(seen_maxs, tile_maxs, side="left")
+        counts = len(seen_maxs) - first
+        outer_i = seen_idx[_ragged_arange(first, counts)]
+        outer_j = np.repeat(tile, counts)
 
-        for j in range(i + 1, len(entries)):
-            entry2 = entries[j]
-            range2 = (entry2["min_shift"] - tolerance, entry2["max_shift"] + tolerance)
+        # Containers within the tile: earlier rows whose max is >= the row's max
+        contains = np.triu(tile_maxs[:, None] >= tile_maxs[None, :], k=1)
+        rows, cols = np.nonzero(contains)
 
-            # Check if ranges overlap 100%
-            if ranges_overlap_100_percent(range1, range2):
-                overlaps.append((entry1, entry2))
+        pair_i = np.concatenate((outer_i, tile[rows]))
+        pair_j = np.concatenate((outer_j, tile[cols]))
 
-    return overlaps
+        # Keep the original file order within each pair
+        lo = np.minimum(pair_i, pair_j).tolist()
+        hi = np.maximum(pair_i, pair_j).tolist()
+        yield from zip(lo, hi)
 
+        # Merge the tile into the sorted visited set
+        by_max = np.argsort(tile_maxs, kind="stable")
+        insert_at = np.searchsorted(seen_maxs, tile_maxs[by_max], side="left")
+        seen_maxs = np.insert(seen_maxs, insert_at, tile_maxs[by_max])
+        seen_idx = np.insert(seen_idx, insert_at, tile[by_max])
 
-def group_overlaps(overlaps):
+
+def group_overlaps(overlaps, weights=None):
     """
     Group overlapping entries together
     Creates groups where all members have overlapping ranges with at least one other member
-    """
-    # Build adjacency list
-    graph = defaultdict(set)
-    all_entries = set()
 
-    for entry1, entry2 in overlaps:
-        id1 = entry1["line_number"]
-        id2 = entry2["line_number"]
-        graph[id1].add(id2)
-        graph[id2].add(id1)
-        all_entries.add(id1)
-        all_entries.add(id2)
+    Uses union-find (union by size + path compression) fed directly from the
+    pair stream, so no adjacency lists are built and grouping is near-linear
+    in the number of pairs. overlaps may be a generator such as
+    find_overlapping_ranges; it is consumed once and never stored.
 
-    # Find connected components using iterative BFS (avoid recursion depth issues)
-    visited = set()
-    groups = []
+    When the nodes stand for several entries each (see dedup_ranges),
+    weights[node] gives that count and each pair is counted as the number of
+    entry pairs it represents.
 
-    for entry_id in all_entries:
-        if entry_id not in visited:
-            group = set()
-            queue = [entry_id]
+    Returns:
+        (groups, pair_count) where groups is a list of sets of entry indices
+    """
+    parent = {}
+    size = {}
+    pair_count = 0
+
+    def find(node):
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        # Point every node on the path straight at the root
+        while parent[node] != root:
+            next_node = parent[node]
+            parent[node] = root
+            node = next_node
+        return root
+
+    for id1, id2 in overlaps:
+        pair_count += 1 if weights is None else weights[id1] * weights[id2]
+        for node in (id1, id2):
+            if node not in parent:
+                parent[node] = node
+                size[node] = 1
+
+        root1 = find(id1)
+        root2 = find(id2)
+        if root1 == root2:
+            continue
+        if size[root1] < size[root2]:
+            root1, root2 = root2, root1
+        parent[root2] = root1
+        size[root1] += size[root2]
+
+    # Collect connected components by root
+    components = defaultdict(set)
+    for node in parent:
+        components[find(node)].add(node)
+
+    return list(components.values()), pair_count
+
+
+def expand_duplicates(groups, range_class):
+    """
+    Map groups of distinct ranges back to groups of entry indices
 
-            while queue:
-                node = queue.pop(0)
-                if node in visited:
-                    continue
+    Entries sharing a range overlap each other too, so a duplicated range
+    that overlaps nothing else still forms a group of its own.
 
-                visited.add(node)
-                group.add(node)
+    Returns:
+        (groups, duplicate_pairs) where duplicate_pairs counts the entry pairs
+        within each distinct range
+    """
+    multiplicity = np.bincount(range_class)
+    starts = np.cumsum(multiplicity) - multiplicity
+    by_class = np.argsort(range_class, kind="stable")
 
-                for neighbor in graph[node]:
-                    if neighbor not in visited:
-                        queue.append(neighbor)
+    def members(node):
+        return by_class[starts[node]:starts[node] + multiplicity[node]].tolist()
 
-            groups.append(group)
+    expanded = []
+    grouped = set()
+    for group in groups:
+        expanded.append({k for node in group for k in members(node)})
+        grouped.update(group)
 
-    return groups
+    for node in np.flatnonzero(multiplicity > 1).tolist():
+        if node not in grouped:
+            expanded.append(set(members(node)))
 
+    duplicate_pairs = int((multiplicity * (multiplicity - 1) // 2).sum())
+    return expanded, duplicate_pairs
 
-def analyze_overlaps(overlaps, entries_dict):
-    """Analyze and display overlap statistics"""
-    if not overlaps:
+
+def analyze_overlaps(pair_count, db, groups):
+    """Analyze and display overlap statistics for precomputed groups"""
+    if not pair_count:
         print("\nNo overlapping ranges found!")
         return
 
     print(f"\n{'='*80}")
     print(f"OVERLAP ANALYSIS")
     print(f"{'='*80}")
-    print(f"Total overlapping pairs: {len(overlaps):,}")
+    print(f"Total overlapping pairs: {pair_count:,}")
 
-    # Group overlaps
-    print("\nGrouping overlapping entries...")
-    groups = group_overlaps(overlaps)
     print(f"Number of overlap groups: {len(groups):,}")
 
     # Analyze group sizes
@@ -212,43 +422,43 @@ def analyze_overlaps(overlaps, entries_dict):
         print(f"Group #{idx}: {len(group)} entries with overlapping ranges")
         print(f"{'='*80}")
 
-        group_entries = [entries_dict[line_num] for line_num in sorted(group)]
+        # Entry indices follow file order, so this also sorts by line number
+        members = np.array(sorted(group), dtype=np.int64)
 
         # Find shift range of entire group
-        all_mins = [e["min_shift"] for e in group_entries]
-        all_maxs = [e["max_shift"] for e in group_entries]
-        group_min = min(all_mins)
-        group_max = max(all_maxs)
+        group_min = db["min_shift"][members].min()
+        group_max = db["max_shift"][members].max()
 
         print(f"Overall range: {group_min:.2f} - {group_max:.2f} ppm")
 
         # Show first 5 entries in group
-        for i, entry in enumerate(group_entries[:5], 1):
-            print(f"\n  Entry {i} (line {entry['line_number']}):")
-            print(f"    Range: {entry['min_shift']:.2f} - {entry['max_shift']:.2f} ppm (avg: {entry['avg_shift']:.2f})")
-            print(f"    Nucleus: {entry['nucleus'][:50]}")
-            print(f"    Solvent: {entry['solvent']}")
-
-            if entry["hose_code"]:
-                env_desc = describe_environment(entry["hose_code"])
+        for i, k in enumerate(members[:5].tolist(), 1):
+            entry = db["entries"][k]
+            print(f"\n  Entry {i} (line {db['line_number'][k]}):")
+            print(f"    Range: {db['min_shift'][k]:.2f} - {db['max_shift'][k]:.2f} ppm (avg: {db['avg_shift'][k]:.2f})")
+            print(f"    Nucleus: {entry.nucleus[:50]}")
+            print(f"    Solvent: {entry.solvent}")
+
+            if entry.hose_code:
+                env_desc = describe_environment(entry.hose_code)
                 print(f"    Environment: {env_desc[:70]}")
-                print(f"    HOSE: {entry['hose_code'][:60]}...")
+                print(f"    HOSE: {entry.hose_code[:60]}...")
 
-        if len(group_entries) > 5:
-            print(f"\n  ... and {len(group_entries) - 5} more entries in this group")
+        if len(members) > 5:
+            print(f"\n  ... and {len(members) - 5} more entries in this group")
 
 
-def export_overlaps(overlaps, entries_dict, output_file="overlapping_ranges.txt"):
-    """Export overlapping entries to a file"""
+def export_overlaps(pair_count, db, groups, output_file="overlapping_ranges.txt"):
+    """Export precomputed overlap groups to a file"""
     print(f"\nExporting overlaps to {output_file}...")
 
-    groups = group_overlaps(overlaps)
     sorted_groups = sorted(groups, key=lambda g: len(g), reverse=True)
 
-    with open(output_file, "w", encoding="utf-8") as f:
+    with open(output_file, "w", encoding="utf-8") as f, open(DB_PATH, "rb") as csv_file, \
+            mmap.mmap(csv_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
         f.write("NMR Database Overlapping Ranges Report\n")
         f.write("="*80 + "\n\n")
-        f.write(f"Total overlapping pairs: {len(overlaps):,}\n")
+        f.write(f"Total overlapping pairs: {pair_count:,}\n")
         f.write(f"Number of overlap groups: {len(groups):,}\n\n")
 
         for idx, group in enumerate(sorted_groups, 1):
@@ -256,12 +466,10 @@ def export_overlaps(overlaps, entries_dict, output_file="overlapping_ranges.txt"
             f.write(f"Group #{idx}: {len(group)} entries\n")
             f.write("="*80 + "\n")
 
-            group_entries = [entries_dict[line_num] for line_num in sorted(group)]
-
-            for entry in group_entries:
-                f.write(f"\nLine {entry['line_number']}:\n")
-                f.write(f"  {entry['full_entry']}\n")
-                f.write(f"  Range: {entry['min_shift']:.2f} - {entry['max_shift']:.2f} ppm\n")
+            for k in sorted(group):
+                f.write(f"\nLine {db['line_number'][k]}:\n")
+                f.write(f"  {db['entries'][k].full_entry(mm)}\n")
+                f.write(f"  Range: {db['min_shift'][k]:.2f} - {db['max_shift'][k]:.2f} ppm\n")
 
     print(f"Export complete: {output_file}")
 
@@ -279,20 +487,27 @@ if __name__ == "__main__":
     print(f"Tolerance: {tolerance} ppm\n")
 
     # Load database
-    entries = load_and_parse_database(max_entries=max_entries)
-
-    # Create lookup dict
-    entries_dict = {e["line_number"]: e for e in entries}
-
-    # Find overlaps
-    overlaps = find_overlapping_ranges(entries, tolerance=tolerance)
+    db = load_and_parse_database(max_entries=max_entries)
+
+    # Sweep one representative per distinct range and stream the pairs
+    # straight into the grouping, once; analysis and export share the
+    # groups and only need the pair count
+    representatives = db["representatives"]
+    overlaps = find_overlapping_ranges(
+        db["min_shift"][representatives], db["max_shift"][representatives], tolerance=tolerance
+    )
+    print("\nGrouping overlapping entries...")
+    multiplicity = np.bincount(db["range_class"]).tolist()
+    groups, pair_count = group_overlaps(overlaps, weights=multiplicity)
+    groups, duplicate_pairs = expand_duplicates(groups, db["range_class"])
+    pair_count += duplicate_pairs
 
     # Analyze
-    analyze_overlaps(overlaps, entries_dict)
+    analyze_overlaps(pair_count, db, groups)
 
     # Export
-    if overlaps:
-        export_overlaps(overlaps, entries_dict)
+    if pair_count:
+        export_overlaps(pair_count, db, groups)
 
     print("\n" + "="*80)
     print("Analysis complete!")
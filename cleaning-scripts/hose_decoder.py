@@ -4,6 +4,39 @@ HOSE = Hierarchically Ordered Spherical Environment
 Describes the chemical environment around a central atom in spheres
 """
 
+import re
+from functools import lru_cache
+
+# Atom symbols listed by decode_hose_code (single characters)
+ATOM_SYMBOLS = frozenset("CHONSPFB")
+
+# The same symbols as a compiled character class, so a sphere's atoms are
+# collected by the C regex engine instead of a per-character Python loop
+ATOM_PATTERN = re.compile("[" + "".join(sorted(ATOM_SYMBOLS)) + "]")
+
+
+def count_atoms(hose_code):
+    """
+    Count the atoms of a HOSE code in a fixed-layout dict
+
+    '/' only separates spheres, so the totals are single C-level str.count
+    scans over the whole code instead of per-character dict updates
+    (multi-letter symbols are read character by character, so Cl, Br and
+    I are never counted)
+    """
+    return {
+        "C": hose_code.count("C"),
+        "H": hose_code.count("H"),
+        "O": hose_code.count("O"),
+        "N": hose_code.count("N"),
+        "S": hose_code.count("S"),
+        "P": hose_code.count("P"),
+        "F": hose_code.count("F"),
+        "Cl": 0,
+        "Br": 0,
+        "I": 0,
+    }
+
 
 def decode_hose_code(hose_code):
     """
@@ -21,104 +54,91 @@ def decode_hose_code(hose_code):
     - Numbers indicate connectivity
     """
 
-    info = {
-        "spheres": [],
-        "atoms": {
-            "C": 0,
-            "H": 0,
-            "O": 0,
-            "N": 0,
-            "S": 0,
-            "P": 0,
-            "F": 0,
-            "Cl": 0,
-            "Br": 0,
-            "I": 0,
-        },
-        "double_bonds": 0,
-        "triple_bonds": 0,
-        "aromatic": False,
-        "ring": False,
-    }
-
     # Split by spheres (separated by /)
-    if "/" in hose_code:
-        spheres = hose_code.split("/")
-    else:
-        spheres = [hose_code]
+    spheres = hose_code.split("/")
 
-    info["num_spheres"] = len(spheres)
-
-    for sphere_idx, sphere in enumerate(spheres):
-        sphere_info = {"level": sphere_idx + 1, "content": sphere, "atoms": []}
+    info = {
+        "spheres": [
+            {
+                "level": sphere_idx + 1,
+                "content": sphere,
+                "atoms": ATOM_PATTERN.findall(sphere),
+            }
+            for sphere_idx, sphere in enumerate(spheres)
+        ],
+        "atoms": count_atoms(hose_code),
+        "double_bonds": hose_code.count("="),
+        "triple_bonds": hose_code.count("#"),
+        # A double bond to C could be aromatic or alkene
+        "aromatic": "=C" in hose_code,
+        "ring": "@" in hose_code,
+        "num_spheres": len(spheres),
+    }
 
-        # Parse the sphere content
-        i = 0
-        while i < len(sphere):
-            char = sphere[i]
+    return info
 
-            # Check for atom symbols
-            if char in ["C", "H", "O", "N", "S", "P", "F", "B"]:
-                info["atoms"][char] += 1
-                sphere_info["atoms"].append(char)
-            # Check for bond types
-            elif char == "=":
-                info["double_bonds"] += 1
-                if i + 1 < len(sphere) and sphere[i + 1] == "C":
-                    # Could be aromatic or alkene
-                    info["aromatic"] = True
-            elif char == "#":
-                info["triple_bonds"] += 1
-            elif char == "@":
-                info["ring"] = True
 
-            i += 1
+def decode_hose_code_light(hose_code):
+    """
+    Decode only the fields describe_environment reads
 
-        info["spheres"].append(sphere_info)
+    Skips decode_hose_code's per-sphere bookkeeping: the atom counts come
+    from the same count_atoms, and a double bond followed by C ("=C") flags
+    aromatic as before.
 
-    return info
+    Returns:
+        (atoms, double_bonds, triple_bonds, aromatic, ring) where atoms is
+        decode_hose_code's atom count dict
+    """
+    return (
+        count_atoms(hose_code),
+        hose_code.count("="),
+        hose_code.count("#"),
+        "=C" in hose_code,
+        "@" in hose_code,
+    )
 
 
+@lru_cache(maxsize=200_000)
 def describe_environment(hose_code):
-    """Generate a human-readable description of the HOSE code"""
-    info = decode_hose_code(hose_code)
+    """Generate a human-readable description of the HOSE code
 
-    descriptions = []
+    Memoized: the same HOSE codes recur across peaks, compounds and search
+    results, and the description is an immutable str.
+    """
+    atoms, double_bonds, triple_bonds, aromatic, ring = decode_hose_code_light(hose_code)
 
-    # Count total heavy atoms (non-H)
-    heavy_atoms = sum(
-        count for atom, count in info["atoms"].items() if atom != "H" and count > 0
-    )
+    descriptions = []
 
     # Describe the environment
-    if info["atoms"]["O"] > 0:
-        if info["double_bonds"] > 0:
+    if atoms["O"] > 0:
+        if double_bonds > 0:
             descriptions.append("carbonyl/carboxyl")
         else:
             descriptions.append("alcohol/ether")
 
-    if info["aromatic"] or (info["double_bonds"] >= 2 and info["atoms"]["C"] > 4):
+    if aromatic or (double_bonds >= 2 and atoms["C"] > 4):
         descriptions.append("aromatic")
-    elif info["double_bonds"] > 0:
+    elif double_bonds > 0:
         descriptions.append("alkene")
 
-    if info["triple_bonds"] > 0:
+    if triple_bonds > 0:
         descriptions.append("alkyne")
 
-    if info["ring"]:
+    if ring:
         descriptions.append("ring")
 
-    if info["atoms"]["N"] > 0:
+    if atoms["N"] > 0:
         descriptions.append("amine/amide")
 
-    if info["atoms"]["S"] > 0:
+    if atoms["S"] > 0:
         descriptions.append("sulfur")
 
     # If no special features, classify by saturation
     if not descriptions:
-        if info["atoms"]["H"] > 2:
+        if atoms["H"] > 2:
             descriptions.append("aliphatic")
-        elif info["atoms"]["C"] > 0:
+        elif atoms["C"] > 0:
             descriptions.append("quaternary")
 
     # Build description string
@@ -129,9 +149,10 @@ def describe_environment(hose_code):
 
     # Add atom count info
     atom_summary = []
-    for atom in ["C", "O", "N", "S"]:
-        if info["atoms"][atom] > 0:
-            atom_summary.append(f"{info['atoms'][atom]}{atom}")
+    for atom in ("C", "O", "N", "S"):
+        count = atoms[atom]
+        if count > 0:
+            atom_summary.append(f"{count}{atom}")
 
     if atom_summary:
         env_desc += f" ({', '.join(atom_summary)} nearby)"
@@ -2,6 +2,16 @@
 HOSE Code Sphere Explanation
 """
 
+from collections import Counter
+
+# HOSE markers for bond/ring features and how to describe them
+SPECIAL_FEATURES = {
+    '=': 'double bond',
+    '#': 'triple bond',
+    '@': 'ring closure',
+    '&': 'heteroatom',
+}
+
 def explain_hose_spheres(hose_code):
     """Break down a HOSE code sphere by sphere"""
 
@@ -19,28 +29,18 @@ def explain_hose_spheres(hose_code):
         print(f"Sphere {i} (distance {i} bonds from central atom):")
         print(f"  Raw content: {sphere}")
 
-        # Count atoms in this sphere
-        atoms = {'C': 0, 'H': 0, 'O': 0, 'N': 0, 'S': 0}
-        special = []
-
-        for char in sphere:
-            if char in atoms:
-                atoms[char] += 1
-            elif char == '=':
-                special.append('double bond')
-            elif char == '#':
-                special.append('triple bond')
-            elif char == '@':
-                special.append('ring closure')
-            elif char == '&':
-                special.append('heteroatom')
+        # Count every character in one C-level pass, then read off the
+        # atoms and bond/ring markers we care about
+        counts = Counter(sphere)
+        atoms = {atom: counts[atom] for atom in ('C', 'H', 'O', 'N', 'S')}
+        special = [name for char, name in SPECIAL_FEATURES.items() if counts[char]]
 
         # Print atom counts
         atom_list = [f"{count}{atom}" for atom, count in atoms.items() if count > 0]
         if atom_list:
             print(f"  Atoms: {', '.join(atom_list)}")
         if special:
-            print(f"  Special features: {', '.join(set(special))}")
+            print(f"  Special features: {', '.join(special)}")
         print()
 
 # Example HOSE codes with different sphere counts
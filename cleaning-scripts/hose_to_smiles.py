@@ -11,6 +11,10 @@ HOSE code structure:
   - '/' separates spheres, ',' separates branches within a sphere
 """
 
+import string
+import sys
+from functools import lru_cache
+
 # Bremser single-letter element substitutions used in HOSE codes
 BREMSER_MAP = {
     "X": "Cl",
@@ -23,6 +27,8 @@ BREMSER_MAP = {
     "M": "Sn",
     "K": "Sb",
 }
+# Interned so atom comparisons in the tree walks hit the identity fast path
+BREMSER_MAP = {k: sys.intern(v) for k, v in BREMSER_MAP.items()}
 
 # Atoms that appear in HOSE codes (single uppercase letter)
 HOSE_ATOMS = set("CHONSPFBIXYQGTALMKZRVWUDEe")
@@ -30,33 +36,56 @@ HOSE_ATOMS = set("CHONSPFBIXYQGTALMKZRVWUDEe")
 # SMILES organic subset (atoms that don't need brackets when uncharged)
 ORGANIC_SUBSET = {"B", "C", "N", "O", "P", "S", "F", "Cl", "Br", "I"}
 
-# Token types
-TOK_ATOM = "ATOM"
-TOK_DOUBLE = "DOUBLE"
-TOK_AROMATIC = "AROMATIC"
-TOK_TRIPLE = "TRIPLE"
-TOK_RING = "RING"
-TOK_SPHERE_SEP = "SPHERE_SEP"
-TOK_BRANCH_SEP = "BRANCH_SEP"
-TOK_OPEN = "OPEN"
-TOK_CLOSE = "CLOSE"
-TOK_CHARGE_POS = "CHARGE_POS"
-TOK_CHARGE_NEG = "CHARGE_NEG"
-TOK_DELOCALIZED = "DELOCALIZED"
-TOK_STEREO = "STEREO"
-
+# Token types, small ints so a token stream fits in a bytearray
+TOK_ATOM = 1
+TOK_DOUBLE = 2
+TOK_AROMATIC = 3
+TOK_TRIPLE = 4
+TOK_RING = 5
+TOK_SPHERE_SEP = 6
+TOK_BRANCH_SEP = 7
+TOK_OPEN = 8
+TOK_CLOSE = 9
+TOK_CHARGE_POS = 10
+TOK_CHARGE_NEG = 11
+TOK_DELOCALIZED = 12
+TOK_STEREO = 13
+
+# Readable names for debugging token streams
+TOKEN_NAMES = {
+    TOK_ATOM: "ATOM",
+    TOK_DOUBLE: "DOUBLE",
+    TOK_AROMATIC: "AROMATIC",
+    TOK_TRIPLE: "TRIPLE",
+    TOK_RING: "RING",
+    TOK_SPHERE_SEP: "SPHERE_SEP",
+    TOK_BRANCH_SEP: "BRANCH_SEP",
+    TOK_OPEN: "OPEN",
+    TOK_CLOSE: "CLOSE",
+    TOK_CHARGE_POS: "CHARGE_POS",
+    TOK_CHARGE_NEG: "CHARGE_NEG",
+    TOK_DELOCALIZED: "DELOCALIZED",
+    TOK_STEREO: "STEREO",
+}
 
-class Token:
-    __slots__ = ("type", "value")
+# Token types that prefix an atom (bonds, ring marker, charges, ...)
+BOND_MASK = frozenset({
+    TOK_DOUBLE,
+    TOK_AROMATIC,
+    TOK_TRIPLE,
+    TOK_RING,
+    TOK_DELOCALIZED,
+    TOK_STEREO,
+    TOK_CHARGE_POS,
+    TOK_CHARGE_NEG,
+})
 
-    def __init__(self, type, value=None):
-        self.type = type
-        self.value = value
+# 1 for every token type in BOND_MASK, indexed directly by the type code
+_IS_BOND_MOD = bytes(1 if t in BOND_MASK else 0 for t in range(256))
 
-    def __repr__(self):
-        if self.value:
-            return f"Token({self.type}, {self.value})"
-        return f"Token({self.type})"
+# Stop sets for _parse_sphere_block
+_STOP_AT_CLOSE = frozenset({TOK_CLOSE})
+_STOP_AT_END = frozenset()
 
 
 class TreeNode:
@@ -70,245 +99,377 @@ class TreeNode:
         "is_aromatic",
         "parent",
         "_ring_close_to",
+        "size",
+        "real_children",
+        "main_child",
     )
 
-    def __init__(self, atom, bond="", sphere=0):
+    def __init__(self, atom, bond="", sphere=0, is_ring_atom=False, charge=0, is_aromatic=False):
         self.atom = atom
         self.bond = bond  # "", "=", "#", "aromatic"
         self.children = []
         self.sphere = sphere
-        self.is_ring_atom = False
-        self.charge = 0
-        self.is_aromatic = False
+        self.is_ring_atom = is_ring_atom
+        self.charge = charge
+        self.is_aromatic = is_aromatic
         self.parent = None
         self._ring_close_to = None  # set when this node closes a ring
+        # Filled in by _annotate_tree before SMILES generation
+        self.size = 1  # nodes in this subtree
+        self.real_children = None  # children minus suppressed implicit H
+        self.main_child = None  # heaviest real child, continues the main chain
 
     def add_child(self, child):
         child.parent = self
         self.children.append(child)
 
 
+class SphereBlock:
+    """Parsed atoms of a HOSE sphere block as parallel lists.
+
+    Atom k is (symbols[k], bonds[k], rings[k], charges[k], aromatics[k]).
+    Branch b holds atoms branch_bounds[b]:branch_bounds[b + 1] and sphere s
+    holds branches sphere_bounds[s]:sphere_bounds[s + 1]. len() is the
+    number of spheres."""
+
+    __slots__ = (
+        "symbols",
+        "bonds",
+        "rings",
+        "charges",
+        "aromatics",
+        "branch_bounds",
+        "sphere_bounds",
+    )
+
+    def __init__(self):
+        self.symbols = []
+        self.bonds = []
+        self.rings = []
+        self.charges = []
+        self.aromatics = []
+        self.branch_bounds = [0]
+        self.sphere_bounds = [0]
+
+    def __len__(self):
+        return len(self.sphere_bounds) - 1
+
+    def close_branch(self):
+        self.branch_bounds.append(len(self.symbols))
+
+    def close_sphere(self):
+        self.sphere_bounds.append(len(self.branch_bounds) - 1)
+
+    def sphere_branches(self, s):
+        """Branch indices of sphere s"""
+        return range(self.sphere_bounds[s], self.sphere_bounds[s + 1])
+
+    def branch_atoms(self, b):
+        """Atom indices of branch b"""
+        return range(self.branch_bounds[b], self.branch_bounds[b + 1])
+
+
+# Token type of every character that produces a token
+_CHAR_TYPES = {
+    "(": TOK_OPEN,
+    ")": TOK_CLOSE,
+    "/": TOK_SPHERE_SEP,
+    ",": TOK_BRANCH_SEP,
+    "=": TOK_DOUBLE,
+    "*": TOK_AROMATIC,
+    "%": TOK_TRIPLE,
+    "#": TOK_TRIPLE,
+    "@": TOK_RING,
+    "&": TOK_DELOCALIZED,
+    "+": TOK_CHARGE_POS,
+    "-": TOK_CHARGE_NEG,
+    "|": TOK_STEREO,
+    "\\": TOK_STEREO,
+}
+_CHAR_TYPES.update(dict.fromkeys(string.ascii_uppercase, TOK_ATOM))
+
+# Atom symbol per uppercase letter, Bremser substitutions resolved
+_ATOM_SYMBOLS = {ch: sys.intern(BREMSER_MAP.get(ch, ch)) for ch in string.ascii_uppercase}
+
+# 256-entry lookup tables indexed by character byte: the token type (0 for
+# characters that produce no token) and the atom symbol (None for non-atoms)
+_TYPE_TABLE = bytes(_CHAR_TYPES.get(chr(b), 0) for b in range(256))
+_NO_TOKEN_BYTES = bytes(b for b in range(256) if not _TYPE_TABLE[b])
+_SYMBOL_TABLE = tuple(_ATOM_SYMBOLS.get(chr(b)) for b in range(256))
+
+
+def _scan(hose_code):
+    """Classify a HOSE code into (types, chars) byte strings.
+
+    chars keeps only the characters that produce a token (dropping
+    lowercase, digits, whitespace, unknown and non-ASCII characters) and
+    types[i] is the TOK_* code of chars[i]; both come from C-level
+    bytes.translate calls."""
+    chars = hose_code.encode("ascii", "ignore").translate(None, _NO_TOKEN_BYTES)
+    return chars.translate(_TYPE_TABLE), chars
+
+
 def tokenize(hose_code):
-    """Convert a HOSE code string into a list of tokens."""
-    tokens = []
-    i = 0
-    n = len(hose_code)
-
-    while i < n:
-        ch = hose_code[i]
-
-        if ch == "(":
-            tokens.append(Token(TOK_OPEN))
-        elif ch == ")":
-            tokens.append(Token(TOK_CLOSE))
-        elif ch == "/":
-            tokens.append(Token(TOK_SPHERE_SEP))
-        elif ch == ",":
-            tokens.append(Token(TOK_BRANCH_SEP))
-        elif ch == "=":
-            tokens.append(Token(TOK_DOUBLE))
-        elif ch == "*":
-            tokens.append(Token(TOK_AROMATIC))
-        elif ch == "%":
-            tokens.append(Token(TOK_TRIPLE))
-        elif ch == "#":
-            tokens.append(Token(TOK_TRIPLE))
-        elif ch == "@":
-            tokens.append(Token(TOK_RING))
-        elif ch == "&":
-            tokens.append(Token(TOK_DELOCALIZED))
-        elif ch == "+":
-            tokens.append(Token(TOK_CHARGE_POS))
-        elif ch == "-":
-            tokens.append(Token(TOK_CHARGE_NEG))
-        elif ch == "|" or ch == "\\":
-            tokens.append(Token(TOK_STEREO))
-        elif ch.isupper():
-            resolved = BREMSER_MAP.get(ch, ch)
-            tokens.append(Token(TOK_ATOM, resolved))
-        # Skip anything else (lowercase, digits, whitespace, unknown)
-
-        i += 1
-
-    return tokens
-
-
-def _is_bond_or_modifier(tok):
-    return tok.type in (
-        TOK_DOUBLE,
-        TOK_AROMATIC,
-        TOK_TRIPLE,
-        TOK_RING,
-        TOK_DELOCALIZED,
-        TOK_STEREO,
-        TOK_CHARGE_POS,
-        TOK_CHARGE_NEG,
+    """Convert a HOSE code string into a token stream.
+
+    Returns (types, values): a bytearray of TOK_* codes and a parallel list
+    holding the atom symbol for ATOM tokens and None for all others.
+
+    Characters are classified by _scan and the symbols are looked up with
+    map, so no per-character loop runs in Python. parse_hose reads the
+    _scan output directly and never builds this stream."""
+    types, chars = _scan(hose_code)
+    return bytearray(types), list(map(_SYMBOL_TABLE.__getitem__, chars))
+
+
+@lru_cache(maxsize=None)
+def _numpy_luts():
+    """Return the (type, symbol) lookup tables as NumPy arrays.
+
+    NumPy is imported here rather than at module level so the converter
+    itself stays stdlib-only; only tokenize_many needs it."""
+    import numpy as np
+
+    return (
+        np.frombuffer(_TYPE_TABLE, dtype=np.uint8),
+        np.array(_SYMBOL_TABLE, dtype=object),
     )
 
 
-def _parse_one_atom(tokens, pos):
+def tokenize_many(hose_codes):
+    """Tokenize a batch of HOSE codes in one vectorized NumPy pass.
+
+    The codes are joined with NUL separators into a single buffer and
+    classified together through the 256-entry lookup tables; the type gather
+    is the whole classification, with no per-character branch. This pays off
+    over whole datasets where per-call overhead would dominate for short
+    strings.
+
+    Returns:
+        List of (types, values) token streams, one per code, as from tokenize
+    """
+    if not hose_codes:
+        return []
+    import numpy as np
+
+    type_lut, symbol_lut = _numpy_luts()
+    buf = np.frombuffer("\x00".join(hose_codes).encode("ascii", "ignore"), dtype=np.uint8)
+    separators = np.flatnonzero(buf == 0)
+    if len(separators) != len(hose_codes) - 1:
+        # A code holds a NUL itself, so the separators are ambiguous
+        return [tokenize(code) for code in hose_codes]
+
+    types = type_lut[buf]
+    keep = types != 0
+
+    # Token count before the end of each code (NUL produces no token)
+    kept_before = np.cumsum(keep)
+    token_ends = kept_before[separators].tolist()
+    token_ends.append(int(kept_before[-1]) if len(buf) else 0)
+
+    all_types = types[keep].tobytes()
+    all_values = symbol_lut[buf[keep]].tolist()
+
+    streams = []
+    start = 0
+    for end in token_ends:
+        streams.append((bytearray(all_types[start:end]), all_values[start:end]))
+        start = end
+    return streams
+
+
+def _parse_one_atom(
+    types,
+    chars,
+    pos,
+    block,
+    _IS_BOND_MOD=_IS_BOND_MOD,
+    _SYMBOLS=_SYMBOL_TABLE,
+    _ATOM=TOK_ATOM,
+    _DOUBLE=TOK_DOUBLE,
+    _AROM=TOK_AROMATIC,
+    _TRIPLE=TOK_TRIPLE,
+    _RING=TOK_RING,
+    _POS=TOK_CHARGE_POS,
+    _NEG=TOK_CHARGE_NEG,
+    _DELOC=TOK_DELOCALIZED,
+):
     """Parse a single atom with its bond prefix, ring marker, charge, etc.
-    Returns (atom_symbol, bond_type, is_ring, charge, is_aromatic, new_pos)
-    or (None, ..., new_pos) if no atom found at this position."""
+    The atom is appended to block; returns the new position. If no atom is
+    found, only the consumed modifiers are skipped.
+
+    The underscored defaults bind module constants as fast locals; they are
+    not meant to be passed."""
     bond = ""
     is_ring = False
     charge = 0
     is_aromatic = False
-    n = len(tokens)
+    n = len(types)
 
     # Consume prefixes
-    while pos < n and _is_bond_or_modifier(tokens[pos]):
-        t = tokens[pos]
-        if t.type == TOK_DOUBLE:
+    while pos < n and _IS_BOND_MOD[types[pos]]:
+        t = types[pos]
+        if t == _DOUBLE:
             bond = "="
-        elif t.type == TOK_AROMATIC:
+        elif t == _AROM:
             is_aromatic = True
             bond = "aromatic"
-        elif t.type == TOK_TRIPLE:
+        elif t == _TRIPLE:
             bond = "#"
-        elif t.type == TOK_RING:
+        elif t == _RING:
             is_ring = True
-        elif t.type == TOK_CHARGE_POS:
+        elif t == _POS:
             charge = 1
-        elif t.type == TOK_CHARGE_NEG:
+        elif t == _NEG:
             charge = -1
-        elif t.type == TOK_DELOCALIZED:
-            pass  # informational, skip
-        elif t.type == TOK_STEREO:
-            pass  # skip stereo markers
+        # Delocalization and stereo markers are informational, skip them
         pos += 1
 
     # Now expect an ATOM token
-    if pos < n and tokens[pos].type == TOK_ATOM:
-        symbol = tokens[pos].value
+    if pos < n and types[pos] == _ATOM:
+        symbol = _SYMBOLS[chars[pos]]
         pos += 1
         # Check for trailing charge after atom
-        if pos < n and tokens[pos].type == TOK_CHARGE_POS:
+        if pos < n and types[pos] == _POS:
             charge = 1
             pos += 1
-        elif pos < n and tokens[pos].type == TOK_CHARGE_NEG:
+        elif pos < n and types[pos] == _NEG:
             charge = -1
             pos += 1
         # Check for trailing aromatic marker (e.g., *C* pattern)
-        if pos < n and tokens[pos].type == TOK_AROMATIC:
+        if pos < n and types[pos] == _AROM:
             is_aromatic = True
             if bond != "aromatic":
                 bond = "aromatic"
             pos += 1
         # Check for trailing delocalization
-        if pos < n and tokens[pos].type == TOK_DELOCALIZED:
+        if pos < n and types[pos] == _DELOC:
             pos += 1
-        return symbol, bond, is_ring, charge, is_aromatic, pos
-
-    return None, bond, is_ring, charge, is_aromatic, pos
-
-
-def _parse_sphere_block(tokens, pos, stop_types):
+        block.symbols.append(symbol)
+        block.bonds.append(bond)
+        block.rings.append(is_ring)
+        block.charges.append(charge)
+        block.aromatics.append(is_aromatic)
+
+    return pos
+
+
+def _parse_sphere_block(
+    types,
+    chars,
+    pos,
+    stop_types,
+    _SPHERE_SEP=TOK_SPHERE_SEP,
+    _BRANCH_SEP=TOK_BRANCH_SEP,
+    _parse_one_atom=_parse_one_atom,
+):
     """Parse sphere content until we hit a token type in stop_types or end of tokens.
-    Returns (list_of_spheres, new_pos) where each sphere is a list of branches,
-    and each branch is a list of (symbol, bond, is_ring, charge, is_aromatic) tuples."""
-    spheres = []
-    current_sphere = []
-    current_branch = []
-    n = len(tokens)
+    Returns (block, new_pos) where block is a SphereBlock of spheres, each a
+    run of branches, each a run of atoms.
+
+    The underscored defaults bind module constants as fast locals."""
+    block = SphereBlock()
+    n = len(types)
 
     while pos < n:
-        if tokens[pos].type in stop_types:
+        t = types[pos]
+        if t in stop_types:
             break
 
-        if tokens[pos].type == TOK_SPHERE_SEP:
-            current_sphere.append(current_branch)
-            spheres.append(current_sphere)
-            current_sphere = []
-            current_branch = []
+        if t == _SPHERE_SEP:
+            block.close_branch()
+            block.close_sphere()
             pos += 1
-        elif tokens[pos].type == TOK_BRANCH_SEP:
-            current_sphere.append(current_branch)
-            current_branch = []
+        elif t == _BRANCH_SEP:
+            block.close_branch()
             pos += 1
         else:
-            sym, bond, is_ring, charge, is_arom, pos = _parse_one_atom(tokens, pos)
-            if sym is not None:
-                current_branch.append((sym, bond, is_ring, charge, is_arom))
-            # If sym is None, we consumed modifiers but found no atom - skip
+            # If no atom follows, we consumed modifiers but found no atom - skip
+            pos = _parse_one_atom(types, chars, pos, block)
 
     # Don't forget the last branch/sphere
-    if current_branch:
-        current_sphere.append(current_branch)
-    if current_sphere:
-        spheres.append(current_sphere)
+    if len(block.symbols) > block.branch_bounds[-1]:
+        block.close_branch()
+    if len(block.branch_bounds) - 1 > block.sphere_bounds[-1]:
+        block.close_sphere()
 
-    return spheres, pos
+    return block, pos
+
+
+def _make_node(block, k, sphere):
+    """Create a TreeNode for atom k of a SphereBlock"""
+    # Every field goes through the constructor, so each slot is written once
+    return TreeNode(
+        block.symbols[k], block.bonds[k], sphere, block.rings[k], block.charges[k], block.aromatics[k]
+    )
 
 
 def parse_hose(hose_code, central_atom="C"):
     """Parse a HOSE code into an atom tree rooted at the central atom.
-    Returns the root TreeNode."""
-    tokens = tokenize(hose_code)
-    if not tokens:
+    Returns the root TreeNode.
+
+    Every atom symbol in the tree is interned: token symbols come from
+    _ATOM_SYMBOLS and the central atom is interned here."""
+    central_atom = sys.intern(central_atom)
+    # Tokenizing is fused into the parse: the parser reads token types and
+    # atom letters straight from the _scan byte strings, with no token list
+    types, chars = _scan(hose_code)
+    if not types:
         root = TreeNode(central_atom, sphere=0)
         return root
 
     root = TreeNode(central_atom, sphere=0)
     pos = 0
-    n = len(tokens)
+    n = len(types)
 
     # Phase 1: Parse sphere 0 atoms (before the first OPEN_PAREN)
-    sphere0_atoms = []
-    while pos < n and tokens[pos].type != TOK_OPEN:
+    sphere0 = SphereBlock()
+    while pos < n and types[pos] != TOK_OPEN:
         # Stop if we hit a sphere separator (shouldn't happen before '(' but be safe)
-        if tokens[pos].type == TOK_SPHERE_SEP:
+        if types[pos] == TOK_SPHERE_SEP:
             pos += 1
             break
-        sym, bond, is_ring, charge, is_arom, pos = _parse_one_atom(tokens, pos)
-        if sym is not None:
-            sphere0_atoms.append((sym, bond, is_ring, charge, is_arom))
+        pos = _parse_one_atom(types, chars, pos, sphere0)
 
     # Detect sphere-0 ring: if ANY sphere-0 atom has is_ring=True,
     # the non-H atoms form a chain (ring path) rather than siblings.
-    has_ring = any(r for _, _, r, _, _ in sphere0_atoms)
+    # Only the ring path needs the H/chain split below
+    has_ring = any(sphere0.rings)
 
     if has_ring:
-        # Separate H atoms (branches) from non-H atoms (ring chain)
-        h_atoms = [(s, b, r, c, a) for s, b, r, c, a in sphere0_atoms if s == "H"]
-        chain_atoms = [(s, b, r, c, a) for s, b, r, c, a in sphere0_atoms if s != "H"]
+        # Separate H atoms (branches) from non-H atoms (ring chain) in one pass
+        h_atoms = []
+        chain_atoms = []
+        for k, sym in enumerate(sphere0.symbols):
+            (h_atoms if sym == "H" else chain_atoms).append(k)
 
         # H atoms are normal branches off root
-        for sym, bond, is_ring, charge, is_arom in h_atoms:
-            child = TreeNode(sym, bond=bond, sphere=1)
+        for k in h_atoms:
+            child = _make_node(sphere0, k, 1)
             child.is_ring_atom = False
-            child.charge = charge
-            child.is_aromatic = is_arom
             root.add_child(child)
 
         # Non-H atoms form a chain: root → first → second → ... → last
         # The last one closes back to root via ring closure
         if chain_atoms:
             prev = root
-            for i, (sym, bond, is_ring, charge, is_arom) in enumerate(chain_atoms):
-                child = TreeNode(sym, bond=bond, sphere=1)
-                child.is_ring_atom = is_ring
-                child.charge = charge
-                child.is_aromatic = is_arom
+            for k in chain_atoms:
+                child = _make_node(sphere0, k, 1)
                 prev.add_child(child)
                 prev = child
             # Mark the last chain atom for ring closure back to root
             prev._ring_close_to = root
     else:
         # Normal case: all sphere-0 atoms are siblings of root
-        for sym, bond, is_ring, charge, is_arom in sphere0_atoms:
-            child = TreeNode(sym, bond=bond, sphere=1)
-            child.is_ring_atom = is_ring
-            child.charge = charge
-            child.is_aromatic = is_arom
-            root.add_child(child)
+        for k in range(len(sphere0.symbols)):
+            root.add_child(_make_node(sphere0, k, 1))
 
     # Phase 2: Parse inner spheres (inside parentheses)
-    inner_spheres = []
-    if pos < n and tokens[pos].type == TOK_OPEN:
+    inner_spheres = SphereBlock()
+    if pos < n and types[pos] == TOK_OPEN:
         pos += 1  # consume '('
-        inner_spheres, pos = _parse_sphere_block(tokens, pos, {TOK_CLOSE})
-        if pos < n and tokens[pos].type == TOK_CLOSE:
+        inner_spheres, pos = _parse_sphere_block(types, chars, pos, _STOP_AT_CLOSE)
+        if pos < n and types[pos] == TOK_CLOSE:
             pos += 1  # consume ')'
 
     # Attach inner spheres to the LAST sphere-0 child
@@ -317,9 +478,9 @@ def parse_hose(hose_code, central_atom="C"):
         _attach_spheres(last_child, inner_spheres)
 
     # Phase 3: Parse outer continuation (after ')')
-    outer_spheres = []
+    outer_spheres = SphereBlock()
     if pos < n:
-        outer_spheres, pos = _parse_sphere_block(tokens, pos, set())
+        outer_spheres, pos = _parse_sphere_block(types, chars, pos, _STOP_AT_END)
 
     # Attach outer spheres to the remaining sphere-0 children (all except last)
     if outer_spheres and len(root.children) > 1:
@@ -332,51 +493,41 @@ def parse_hose(hose_code, central_atom="C"):
     return root
 
 
-def _attach_spheres(parent_node, spheres):
+def _attach_spheres(parent_node, spheres, first=0):
     """Attach parsed sphere data as children in the tree.
-    spheres[0] = sphere 1 data (children of parent_node)
-    spheres[1] = sphere 2 data (grandchildren) etc."""
-    if not spheres:
+    Sphere first of the SphereBlock = sphere 1 data (children of parent_node),
+    the one after it = sphere 2 data (grandchildren) etc."""
+    if first >= len(spheres):
         return
 
     # Sphere 1: create children of parent_node
-    sphere1 = spheres[0]  # list of branches
-    for branch in sphere1:
-        for sym, bond, is_ring, charge, is_arom in branch:
-            child = TreeNode(sym, bond=bond, sphere=parent_node.sphere + 1)
-            child.is_ring_atom = is_ring
-            child.charge = charge
-            child.is_aromatic = is_arom
-            parent_node.add_child(child)
+    for b in spheres.sphere_branches(first):
+        for k in spheres.branch_atoms(b):
+            parent_node.add_child(_make_node(spheres, k, parent_node.sphere + 1))
 
     # For sphere 2+, distribute branches among expandable (non-H) children
-    if len(spheres) > 1:
-        _attach_deeper_spheres(parent_node, spheres[1:])
+    if len(spheres) - first > 1:
+        _attach_deeper_spheres(parent_node, spheres, first + 1)
 
 
-def _attach_deeper_spheres(parent_node, remaining_spheres):
-    """Recursively attach deeper sphere data to expandable descendants."""
-    if not remaining_spheres:
+def _attach_deeper_spheres(parent_node, spheres, first):
+    """Attach deeper sphere data (spheres first onwards) to expandable descendants."""
+    if first >= len(spheres):
         return
 
     # Get expandable children (non-H atoms can have further neighbors)
     expandable = [c for c in parent_node.children if c.atom != "H"]
 
-    sphere_data = remaining_spheres[0]  # list of branches
     # Each branch corresponds to one expandable child
-    for i, branch in enumerate(sphere_data):
+    for i, b in enumerate(spheres.sphere_branches(first)):
         if i >= len(expandable):
             break
         target = expandable[i]
-        for sym, bond, is_ring, charge, is_arom in branch:
-            child = TreeNode(sym, bond=bond, sphere=target.sphere + 1)
-            child.is_ring_atom = is_ring
-            child.charge = charge
-            child.is_aromatic = is_arom
-            target.add_child(child)
+        for k in spheres.branch_atoms(b):
+            target.add_child(_make_node(spheres, k, target.sphere + 1))
 
     # Continue to next sphere level
-    if len(remaining_spheres) > 1:
+    if len(spheres) - first > 1:
         # Collect all expandable atoms at the current deepest level
         next_expandable = []
         for c in expandable:
@@ -384,49 +535,40 @@ def _attach_deeper_spheres(parent_node, remaining_spheres):
                 if gc.atom != "H":
                     next_expandable.append(gc)
 
-        if next_expandable and remaining_spheres[1]:
-            # Create a synthetic parent to pass to _attach_deeper_spheres
-            # Actually we just distribute the next sphere's branches
-            next_sphere_data = remaining_spheres[1]
-            for i, branch in enumerate(next_sphere_data):
+        next_branches = spheres.sphere_branches(first + 1)
+        if next_expandable and next_branches:
+            # Distribute the next sphere's branches
+            for i, b in enumerate(next_branches):
                 if i >= len(next_expandable):
                     break
                 target = next_expandable[i]
-                for sym, bond, is_ring, charge, is_arom in branch:
-                    child = TreeNode(
-                        sym, bond=bond, sphere=target.sphere + 1
-                    )
-                    child.is_ring_atom = is_ring
-                    child.charge = charge
-                    child.is_aromatic = is_arom
-                    target.add_child(child)
+                for k in spheres.branch_atoms(b):
+                    target.add_child(_make_node(spheres, k, target.sphere + 1))
 
             # Handle spheres beyond 3 with the same pattern
-            if len(remaining_spheres) > 2:
+            if len(spheres) - first > 2:
                 deeper_expandable = []
                 for ne in next_expandable:
                     for c in ne.children:
                         if c.atom != "H":
                             deeper_expandable.append(c)
-                _distribute_flat(deeper_expandable, remaining_spheres[2:])
+                _distribute_flat(deeper_expandable, spheres, first + 2)
 
 
-def _distribute_flat(expandable_nodes, remaining_spheres):
-    """Distribute remaining sphere data across expandable nodes, one level at a time."""
+def _distribute_flat(expandable_nodes, spheres, first):
+    """Distribute sphere data (spheres first onwards) across expandable nodes, one level at a time."""
     current_expandable = expandable_nodes
-    for sphere_data in remaining_spheres:
-        if not current_expandable or not sphere_data:
+    for s in range(first, len(spheres)):
+        branches = spheres.sphere_branches(s)
+        if not current_expandable or not branches:
             break
         next_expandable = []
-        for i, branch in enumerate(sphere_data):
+        for i, b in enumerate(branches):
             if i >= len(current_expandable):
                 break
             target = current_expandable[i]
-            for sym, bond, is_ring, charge, is_arom in branch:
-                child = TreeNode(sym, bond=bond, sphere=target.sphere + 1)
-                child.is_ring_atom = is_ring
-                child.charge = charge
-                child.is_aromatic = is_arom
+            for k in spheres.branch_atoms(b):
+                child = _make_node(spheres, k, target.sphere + 1)
                 target.add_child(child)
                 if child.atom != "H":
                     next_expandable.append(child)
@@ -445,17 +587,12 @@ def _distribute_outer_spheres(remaining_children, spheres):
         return
 
     # Sphere 1 of outer continuation = children of these remaining nodes
-    sphere1 = spheres[0]
-    for i, branch in enumerate(sphere1):
+    for i, b in enumerate(spheres.sphere_branches(0)):
         if i >= len(expandable):
             break
         target = expandable[i]
-        for sym, bond, is_ring, charge, is_arom in branch:
-            child = TreeNode(sym, bond=bond, sphere=target.sphere + 1)
-            child.is_ring_atom = is_ring
-            child.charge = charge
-            child.is_aromatic = is_arom
-            target.add_child(child)
+        for k in spheres.branch_atoms(b):
+            target.add_child(_make_node(spheres, k, target.sphere + 1))
 
     # Deeper spheres
     if len(spheres) > 1:
@@ -464,16 +601,14 @@ def _distribute_outer_spheres(remaining_children, spheres):
             for c in e.children:
                 if c.atom != "H":
                     next_expandable.append(c)
-        _distribute_flat(next_expandable, spheres[1:])
+        _distribute_flat(next_expandable, spheres, 1)
 
 
-def _format_atom_smiles(node):
-    """Format a single atom for SMILES output."""
-    atom = node.atom
-    charge = node.charge
-
+@lru_cache(maxsize=256)
+def _format_atom_cached(atom, charge, is_aromatic):
+    """Format an atom for SMILES output; the few possible inputs are memoized."""
     # Aromatic atoms use lowercase
-    if node.is_aromatic and atom in ("C", "N", "O", "S", "P"):
+    if is_aromatic and atom in ("C", "N", "O", "S", "P"):
         atom = atom.lower()
 
     # Determine if we need bracket notation
@@ -494,14 +629,8 @@ def _format_atom_smiles(node):
     return atom
 
 
-def _format_bond_smiles(bond):
-    """Format a bond for SMILES output."""
-    if bond == "=":
-        return "="
-    if bond == "#":
-        return "#"
-    # Aromatic and single bonds are implicit
-    return ""
+# Explicit SMILES bond symbols; aromatic and single bonds are implicit
+_BOND_SMILES = {"=": "=", "#": "#"}
 
 
 def _find_ring_pairs(root):
@@ -512,17 +641,19 @@ def _find_ring_pairs(root):
     into (ancestor, closer, ring_id) triples for SMILES ring digits.
     """
     pairs = []
-    ring_id = 1
-    _collect_ring_close(root, pairs, ring_id)
+    _collect_ring_close(root, pairs)
     return pairs
 
 
-def _collect_ring_close(node, pairs, ring_id):
-    """Walk the tree collecting _ring_close_to markers."""
-    if node._ring_close_to is not None:
-        pairs.append((node._ring_close_to, node, len(pairs) + 1))
-    for child in node.children:
-        _collect_ring_close(child, pairs, ring_id)
+def _collect_ring_close(root, pairs):
+    """Walk the tree in pre-order collecting _ring_close_to markers."""
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node._ring_close_to is not None:
+            pairs.append((node._ring_close_to, node, len(pairs) + 1))
+        # Reversed so children are visited in order
+        stack.extend(reversed(node.children))
 
 
 def tree_to_smiles(root, ring_pairs=None):
@@ -538,6 +669,7 @@ def tree_to_smiles(root, ring_pairs=None):
         ring_opens.setdefault(ancestor, []).append(rid)
         ring_closers[closer] = (rid, closer.bond)
 
+    _annotate_tree(root)
     return _gen_smiles(root, ring_opens, ring_closers)
 
 
@@ -553,62 +685,128 @@ def _is_implicit_h(node):
     return True
 
 
-def _gen_smiles(node, ring_opens, ring_closers):
-    """Recursive SMILES generation with implicit hydrogen suppression."""
-    parts = []
-
-    # Write atom
-    parts.append(_format_atom_smiles(node))
-
-    # If this node is a ring closer, emit the ring digit and stop
-    if node in ring_closers:
-        rid, bond = ring_closers[node]
-        parts.append(str(rid) if rid < 10 else "%" + str(rid))
-        return "".join(parts)
-
-    # Write ring-open digits at this node
-    if node in ring_opens:
-        for rid in ring_opens[node]:
-            parts.append(str(rid) if rid < 10 else "%" + str(rid))
-
-    # Collect children, suppressing implicit H
-    real_children = [c for c in node.children if not _is_implicit_h(c)]
-
-    if not real_children:
-        return "".join(parts)
-
-    if len(real_children) == 1:
-        child = real_children[0]
-        parts.append(_format_bond_smiles(child.bond))
-        parts.append(_gen_smiles(child, ring_opens, ring_closers))
-    else:
-        # Pick the "heaviest" child as main chain (most descendants)
-        main = max(real_children, key=lambda c: _subtree_size(c))
-        branches = [c for c in real_children if c is not main]
-
-        for bc in branches:
-            parts.append("(")
-            parts.append(_format_bond_smiles(bc.bond))
-            parts.append(_gen_smiles(bc, ring_opens, ring_closers))
-            parts.append(")")
-
-        parts.append(_format_bond_smiles(main.bond))
-        parts.append(_gen_smiles(main, ring_opens, ring_closers))
-
-    return "".join(parts)
-
+def _gen_smiles(root, ring_opens, ring_closers):
+    """SMILES generation with implicit hydrogen suppression.
+
+    Iterative DFS: the work stack holds nodes still to write and literal
+    strings ("(", ")", bonds) to emit between them, all appended to one
+    output list that is joined once. Atom and bond formatting go straight
+    to the memoized lookups, bound to locals."""
+    out = []
+    work = [root]
+    emit = out.append
+    push = work.append
+    format_atom = _format_atom_cached
+    bond_smiles = _BOND_SMILES.get
+
+    while work:
+        node = work.pop()
+        if isinstance(node, str):
+            emit(node)
+            continue
+
+        # Write atom
+        emit(format_atom(node.atom, node.charge, node.is_aromatic))
+
+        # If this node is a ring closer, emit the ring digit and stop
+        if node in ring_closers:
+            rid, bond = ring_closers[node]
+            emit(str(rid) if rid < 10 else "%" + str(rid))
+            continue
+
+        # Write ring-open digits at this node
+        if node in ring_opens:
+            for rid in ring_opens[node]:
+                emit(str(rid) if rid < 10 else "%" + str(rid))
+
+        # The main chain child and the other real children (implicit H
+        # suppressed) were chosen by _annotate_tree; the others become
+        # parenthesized branches written before the main chain
+        main = node.main_child
+        if main is None:
+            continue
+        real_children = node.real_children
+
+        # Pushed in reverse so they pop in output order
+        push(main)
+        push(bond_smiles(main.bond, ""))
+        for bc in reversed(real_children):
+            if bc is not main:
+                push(")")
+                push(bc)
+                push(bond_smiles(bc.bond, ""))
+                push("(")
+
+    return "".join(out)
+
+
+def _annotate_tree(root):
+    """Prepare every node for SMILES generation in one bottom-up pass.
+
+    Stores the subtree node count (size), the children that are written
+    (real_children, implicit H suppressed) and the heaviest of those, which
+    continues the main chain (main_child, first one on ties)."""
+    order = [root]
+    for node in order:
+        order.extend(node.children)
+    # Children always come after their parent in breadth-first order
+    for node in reversed(order):
+        size = 1
+        real_children = []
+        main = None
+        for c in node.children:
+            size += c.size
+            if not _is_implicit_h(c):
+                real_children.append(c)
+                if main is None or c.size > main.size:
+                    main = c
+        node.size = size
+        node.real_children = real_children
+        node.main_child = main
+
+
+def _quick_validate(hose_code):
+    """Cheap structural check of a HOSE code before it is parsed.
+
+    Requires at least one atom and at most one parenthesized block, opened
+    where sphere 0 ends; sphere 0 may not hold ',' or ')' and ')' may not
+    follow the block again. A missing ')' is accepted, as truncated codes
+    still convert. The rejected shapes are the ones the parser cannot
+    consume, so they fail here in one C-level scan instead of in parse_hose.
+    """
+    types, _ = _scan(hose_code)
+    if TOK_ATOM not in types:
+        return False
+    n = len(types)
+    open_at = types.find(TOK_OPEN)
+    if open_at == -1:
+        open_at = n
+    sep_at = types.find(TOK_SPHERE_SEP)
+    if sep_at == -1:
+        sep_at = n
+
+    # Sphere 0 runs up to the '(' or the first '/'
+    sphere0_end = min(open_at, sep_at)
+    if types.find(TOK_BRANCH_SEP, 0, sphere0_end) != -1:
+        return False
+    if types.find(TOK_CLOSE, 0, sphere0_end) != -1:
+        return False
 
-def _subtree_size(node):
-    """Count total nodes in subtree."""
-    count = 1
-    for c in node.children:
-        count += _subtree_size(c)
-    return count
+    if open_at < n:
+        # The block opens right after sphere 0, at most once
+        if sep_at < open_at - 1 or types.count(TOK_OPEN) > 1:
+            return False
+        return types.count(TOK_CLOSE) <= 1
+    return TOK_CLOSE not in types
 
 
+@lru_cache(maxsize=131072)
 def hose_to_smiles(hose_code, central_atom="C"):
     """Convert a HOSE code to a SMILES fragment string.
 
+    The conversion is pure, so results (failures included) are memoized per
+    (hose_code, central_atom): identical environments recur across molecules.
+
     Args:
         hose_code: The HOSE code string (e.g., "C(=CC/HC,HHH/HHC)")
         central_atom: The central atom symbol (from the Nucleus field, e.g., "C")
@@ -618,13 +816,16 @@ def hose_to_smiles(hose_code, central_atom="C"):
     """
     if not hose_code or not hose_code.strip():
         return None
+    if not _quick_validate(hose_code):
+        return None
 
     try:
         root = parse_hose(hose_code, central_atom)
         ring_pairs = _find_ring_pairs(root)
         smiles = tree_to_smiles(root, ring_pairs)
         return smiles if smiles else None
-    except Exception:
+    except (IndexError, KeyError, AttributeError):
+        # Safety net only: _quick_validate rejects the malformed shapes
         return None
 
 
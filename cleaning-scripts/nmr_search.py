@@ -4,69 +4,222 @@ Search for peaks by chemical shift values
 """
 
 import sys
+from array import array
+from collections import defaultdict
+from collections.abc import Sequence
+from functools import lru_cache
+
+import numpy as np
+
 from hose_decoder import describe_environment
+from nmrshiftdb_reader import iter_lines, load_sidecar, save_sidecar
 
+DB_PATH = "nmrshiftdb2/nmrshiftdb.csv"
+
+# Bump when the parsed columns change so stale pickle sidecars are ignored
+CACHE_VERSION = 2
+
+# Padding (ppm) of the shift search windows, far above float rounding
+# error, so the exact tolerance check alone decides the window edges
+WINDOW_MARGIN_PPM = 1e-6
+
+
+class ShiftDatabase(Sequence):
+    """
+    Columnar NMR database whose entry dicts are built on access
+
+    The numeric fields live in NumPy columns and the text fields in lists
+    (the few distinct solvent and nucleus strings interned), instead of one
+    8-key dict per row. Indexing returns a fresh entry dict with the same
+    keys as before, so callers that iterate, index or len() the database
+    work unchanged.
+
+    sorted_shifts holds avg_shifts in ascending order, with shift_order
+    mapping each back to its entry, so shift searches binary-search that
+    index instead of scanning every entry. compound_index caches
+    _compound_index.
+    """
+
+    def __init__(self, solvents, nuclei, structures, min_shifts, max_shifts, avg_shifts, counts):
+        self.solvents = solvents
+        self.nuclei = nuclei
+        self.structures = structures
+        self.min_shifts = min_shifts
+        self.max_shifts = max_shifts
+        self.avg_shifts = avg_shifts
+        self.counts = counts
+        self.shift_order = np.argsort(avg_shifts, kind="stable")
+        self.sorted_shifts = avg_shifts[self.shift_order]
+        self.compound_index = None
+
+    def __len__(self):
+        return len(self.structures)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+
+        structure = self.structures[idx]
+
+        # Extract HOSE code (second ';'-separated field), splitting once
+        structure_fields = structure.split(";", 2)
+        return {
+            "solvent": self.solvents[idx],
+            "nucleus": self.nuclei[idx],
+            "structure": structure,
+            "hose_code": structure_fields[1] if len(structure_fields) > 1 else "",
+            "min_shift": float(self.min_shifts[idx]),
+            "max_shift": float(self.max_shifts[idx]),
+            "avg_shift": float(self.avg_shifts[idx]),
+            "count": int(self.counts[idx]),
+        }
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
 
-def load_database(max_entries=None):
-    """Load the NMR database"""
-    print("Loading NMR database...")
-    data = []
 
-    with open("nmrshiftdb2/nmrshiftdb.csv", "r", encoding="utf-8") as f:
-        for idx, line in enumerate(f):
-            if max_entries and idx >= max_entries:
-                break
+class EntryView(Sequence):
+    """Lazy sequence of the ShiftDatabase entries at the given indices"""
 
-            line = line.strip()
-            if not line:
-                continue
+    __slots__ = ("database", "ids")
 
-            try:
-                parts = line.split("_")
-                if len(parts) >= 4:
-                    solvent = parts[0]
-                    nucleus_info = parts[1]
-                    structure = parts[2]
+    def __init__(self, database, ids):
+        self.database = database
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self.database[i] for i in self.ids[idx]]
+        return self.database[self.ids[idx]]
+
+
+def _parse_database(max_entries=None):
+    """
+    Parse the CSV into ShiftDatabase columns
+
+    Returns:
+        (solvents, nuclei, structures, min_shifts, max_shifts, avg_shifts,
+        counts), the ShiftDatabase constructor arguments
+    """
+    solvents = []
+    nuclei = []
+    structures = []
+    min_shifts = array("d")
+    max_shifts = array("d")
+    avg_shifts = array("d")
+    counts = array("q")
+
+    # Decoded solvent/nucleus names keyed by their raw bytes; the handful of
+    # distinct values is decoded (and interned) once instead of per row
+    names = {}
+
+    # Lines come from a memory map as bytes; the shift fields are parsed
+    # straight from bytes and only the text fields are decoded
+    for idx, raw_line in enumerate(iter_lines(DB_PATH)):
+        if max_entries and idx >= max_entries:
+            break
+
+        line = raw_line.strip()
+        if not line:
+            continue
+
+        try:
+            # The 4 shift fields are peeled off the right; rows with any
+            # other underscore (e.g. inside the solvent) are skipped, since
+            # their fields cannot be told apart
+            parts = line.rsplit(b"_", 4)
+            if len(parts) == 5:
+                front_parts = parts[0].split(b"_", 2)
+                if len(front_parts) == 3 and b"_" not in front_parts[2]:
+                    solvent, nucleus_info, structure = front_parts
 
                     # Extract chemical shifts
-                    shift_parts = parts[3:]
-                    shift_str = "_".join(shift_parts)
-                    shift_values = shift_str.split("_")
-
-                    if len(shift_values) >= 4:
-                        min_shift = float(shift_values[0])
-                        max_shift = float(shift_values[1])
-                        avg_shift = float(shift_values[2])
-                        count = int(shift_values[3])
-
-                        # Extract HOSE code
-                        hose_code = ""
-                        if ";" in structure:
-                            hose_code = (
-                                structure.split(";")[1]
-                                if len(structure.split(";")) > 1
-                                else ""
-                            )
-
-                        data.append(
-                            {
-                                "solvent": solvent,
-                                "nucleus": nucleus_info,
-                                "structure": structure,
-                                "hose_code": hose_code,
-                                "min_shift": min_shift,
-                                "max_shift": max_shift,
-                                "avg_shift": avg_shift,
-                                "count": count,
-                            }
+                    min_shift = float(parts[1])
+                    max_shift = float(parts[2])
+                    avg_shift = float(parts[3])
+                    count = int(parts[4])
+
+                    solvent_name = names.get(solvent)
+                    if solvent_name is None:
+                        solvent_name = names[solvent] = sys.intern(solvent.decode("utf-8"))
+                    nucleus_name = names.get(nucleus_info)
+                    if nucleus_name is None:
+                        nucleus_name = names[nucleus_info] = sys.intern(
+                            nucleus_info.decode("utf-8")
                         )
-            except Exception as e:
-                continue
 
+                    solvents.append(solvent_name)
+                    nuclei.append(nucleus_name)
+                    structures.append(structure.decode("utf-8"))
+                    min_shifts.append(min_shift)
+                    max_shifts.append(max_shift)
+                    avg_shifts.append(avg_shift)
+                    counts.append(count)
+        except Exception as e:
+            continue
+
+    return (
+        solvents,
+        nuclei,
+        structures,
+        np.frombuffer(min_shifts, dtype=np.float64),
+        np.frombuffer(max_shifts, dtype=np.float64),
+        np.frombuffer(avg_shifts, dtype=np.float64),
+        np.frombuffer(counts, dtype=np.int64),
+    )
+
+
+@lru_cache(maxsize=4)
+def load_database(max_entries=None):
+    """
+    Load the NMR database
+
+    Loaded databases are memoized per max_entries, so repeated searches in
+    one process (quick_search.search_nmr, example_search) parse the CSV once
+    and share the returned ShiftDatabase.
+
+    The parsed columns are also cached in nmrshiftdb2/nmrshiftdb.database.pickle
+    and reused until the CSV changes, so later runs (every search_cli
+    invocation) skip parsing.
+    """
+    print("Loading NMR database...")
+
+    cache_key = (CACHE_VERSION, max_entries)
+    columns = load_sidecar(DB_PATH, "database", key=cache_key)
+    if columns is None:
+        columns = _parse_database(max_entries)
+        save_sidecar(DB_PATH, "database", columns, key=cache_key)
+    else:
+        print("Loaded parsed entries from cache")
+
+    data = ShiftDatabase(*columns)
     print(f"Loaded {len(data)} entries")
     return data
 
 
+def _shift_index(database):
+    """
+    Return (sorted_shifts, order) for database, where sorted_shifts[i] is the
+    avg_shift of database[order[i]]
+
+    A ShiftDatabase carries the index from load_database; plain lists of
+    entries are indexed on the fly.
+    """
+    if isinstance(database, ShiftDatabase):
+        return database.sorted_shifts, database.shift_order
+
+    shifts = np.fromiter(
+        (entry["avg_shift"] for entry in database),
+        dtype=np.float64,
+        count=len(database),
+    )
+    order = np.argsort(shifts, kind="stable")
+    return shifts[order], order
+
+
 def search_by_shift(database, target_shift, tolerance=0.5, max_results=20):
     """
     Search for peaks matching a chemical shift value
@@ -80,19 +233,130 @@ def search_by_shift(database, target_shift, tolerance=0.5, max_results=20):
     Returns:
         List of matching entries
     """
+    sorted_shifts, order = _shift_index(database)
+
+    # Binary-search the tolerance window, padded by WINDOW_MARGIN_PPM so the
+    # exact check below decides the edges (repeated edge values included)
+    left = np.searchsorted(sorted_shifts, target_shift - tolerance - WINDOW_MARGIN_PPM, "left")
+    right = np.searchsorted(sorted_shifts, target_shift + tolerance + WINDOW_MARGIN_PPM, "right")
+    diffs = np.abs(sorted_shifts[left:right] - target_shift)
+    within = diffs <= tolerance
+    idxs = order[left:right][within]
+    diffs = diffs[within]
+
+    # Only the closest max_results need sorting: partition out the cutoff
+    # difference and drop everything beyond it (ties at the cutoff are kept)
+    if max_results is not None and 0 < max_results < len(idxs):
+        cutoff = np.partition(diffs, max_results - 1)[max_results - 1]
+        closest = diffs <= cutoff
+        idxs = idxs[closest]
+        diffs = diffs[closest]
+
+    # Sort by difference (closest matches first, database order on ties)
+    ranked = np.lexsort((idxs, diffs))[:max_results]
+
     matches = []
+    for idx, diff in zip(idxs[ranked].tolist(), diffs[ranked].tolist()):
+        entry = database[idx]
+        entry["shift_difference"] = diff
+        matches.append(entry)
 
-    for entry in database:
-        # Check if target shift falls within the range or is close to average
-        if abs(entry["avg_shift"] - target_shift) <= tolerance:
-            diff = abs(entry["avg_shift"] - target_shift)
-            entry["shift_difference"] = diff
-            matches.append(entry)
+    return matches
+
+
+def _compound_index(database):
+    """
+    Group database entries by structure into flat, compound-major arrays
 
-    # Sort by difference (closest matches first)
-    matches.sort(key=lambda x: x["shift_difference"])
+    Compound c's entries are database[i] for i in entry_ids[ptr[c]:ptr[c + 1]]
+    (a CSR layout, database order within each compound), and shifts holds
+    their avg_shift values in the same layout, so matching runs over one
+    flat array instead of a Python loop per compound.
 
-    return matches[:max_results]
+    sorted_shifts holds those shifts in ascending order, with shift_order
+    mapping each back to its position in shifts: an inverted index from
+    shift to compound, so each query peak binary-searches its tolerance
+    window instead of scanning every peak. The index is cached on a
+    ShiftDatabase, so repeated peak-list searches group only once.
+
+    Returns:
+        Dict of the arrays above plus "structures", the structure of each
+        compound
+    """
+    if isinstance(database, ShiftDatabase):
+        if database.compound_index is not None:
+            return database.compound_index
+        structure_of = database.structures
+        avg_shifts = database.avg_shifts
+    else:
+        structure_of = [entry["structure"] for entry in database]
+        avg_shifts = np.fromiter(
+            (entry["avg_shift"] for entry in database),
+            dtype=np.float64,
+            count=len(database),
+        )
+
+    compounds = defaultdict(list)
+    for idx, structure in enumerate(structure_of):
+        compounds[structure].append(idx)
+
+    structures = list(compounds)
+    ptr = np.zeros(len(structures) + 1, dtype=np.int64)
+    np.cumsum([len(ids) for ids in compounds.values()], out=ptr[1:])
+    entry_ids = np.fromiter(
+        (idx for ids in compounds.values() for idx in ids),
+        dtype=np.int64,
+        count=len(structure_of),
+    )
+    shifts = avg_shifts[entry_ids]
+    shift_order = np.argsort(shifts, kind="stable")
+
+    index = {
+        "structures": structures,
+        "ptr": ptr,
+        "entry_ids": entry_ids,
+        "shifts": shifts,
+        "sorted_shifts": shifts[shift_order],
+        "shift_order": shift_order,
+    }
+
+    if isinstance(database, ShiftDatabase):
+        database.compound_index = index
+    return index
+
+
+def _first_matches(index, peak_list, tolerance):
+    """
+    Find, for every query peak, the compounds with a peak within tolerance
+    and the first such peak (in database order) of each
+
+    Each query peak's tolerance window (padded by WINDOW_MARGIN_PPM) comes
+    from two binary searches of the sorted shift index, so only the peaks
+    near the query are touched; the exact check then trims the padding.
+    Sorting the hits back into position order makes the first hit per CSR
+    segment the compound's first matching peak.
+
+    Returns:
+        List with one (compounds, positions) pair of arrays per query peak,
+        positions indexing the compound-major shifts
+    """
+    shifts = index["shifts"]
+    ptr = index["ptr"]
+    shift_order = index["shift_order"]
+    sorted_shifts = index["sorted_shifts"]
+
+    queries = np.asarray(peak_list, dtype=np.float64)
+    lefts = np.searchsorted(sorted_shifts, queries - tolerance - WINDOW_MARGIN_PPM, "left")
+    rights = np.searchsorted(sorted_shifts, queries + tolerance + WINDOW_MARGIN_PPM, "right")
+
+    first = []
+    for query_shift, left, right in zip(peak_list, lefts.tolist(), rights.tolist()):
+        hits = shift_order[left:right]
+        hits = np.sort(hits[np.abs(query_shift - shifts[hits]) <= tolerance])
+        segments = np.searchsorted(ptr, hits, "right") - 1
+        segments, first_hit = np.unique(segments, return_index=True)
+        first.append((segments, hits[first_hit]))
+    return first
 
 
 def search_by_peak_list(database, peak_list, tolerance=0.5, min_matches=3):
@@ -108,45 +372,64 @@ def search_by_peak_list(database, peak_list, tolerance=0.5, min_matches=3):
     Returns:
         Dictionary of compounds with their matched peaks
     """
-    from collections import defaultdict
-
-    # Group database by structure
-    compounds = defaultdict(list)
-    for entry in database:
-        compounds[entry["structure"]].append(entry)
+    index = _compound_index(database)
+    structures = index["structures"]
+    ptr = index["ptr"]
+    entry_ids = index["entry_ids"]
+    no_match = len(entry_ids)
+
+    # Count matched query peaks per compound from the inverted index, then
+    # build match records only for the compounds that qualify
+    per_query = _first_matches(index, peak_list, tolerance)
+    match_counts = np.zeros(len(structures), dtype=np.int64)
+    for compounds, _ in per_query:
+        match_counts[compounds] += 1
+    qualifying = np.flatnonzero(match_counts >= min_matches)
+
+    # first[q, k]: position of qualifying compound k's first peak matching
+    # query peak q (no_match if none)
+    slot = np.full(len(structures), -1, dtype=np.int64)
+    slot[qualifying] = np.arange(len(qualifying))
+    first = np.full((len(peak_list), len(qualifying)), no_match, dtype=np.int64)
+    for qi, (compounds, positions) in enumerate(per_query):
+        slots = slot[compounds]
+        kept = slots >= 0
+        first[qi, slots[kept]] = positions[kept]
 
     matches = []
 
-    for structure, peaks in compounds.items():
+    for k, c in enumerate(qualifying.tolist()):
+        ids = entry_ids[ptr[c]:ptr[c + 1]].tolist()
+        if isinstance(database, ShiftDatabase):
+            # Compounds can hold thousands of peaks; build their dicts lazily
+            peaks = EntryView(database, ids)
+        else:
+            peaks = [database[idx] for idx in ids]
         matched_peaks = []
-        db_shifts = [p["avg_shift"] for p in peaks]
-
-        # For each query peak, find if there's a matching DB peak
-        for query_shift in peak_list:
-            for idx, db_shift in enumerate(db_shifts):
-                if abs(query_shift - db_shift) <= tolerance:
-                    matched_peaks.append(
-                        {
-                            "query_shift": query_shift,
-                            "db_shift": db_shift,
-                            "db_entry": peaks[idx],
-                            "difference": abs(query_shift - db_shift),
-                        }
-                    )
-                    break
-
-        # If enough peaks matched, add this compound to results
-        if len(matched_peaks) >= min_matches:
-            matches.append(
-                {
-                    "structure": structure,
-                    "all_peaks": peaks,
-                    "matched_peaks": matched_peaks,
-                    "match_count": len(matched_peaks),
-                    "total_peaks": len(peaks),
-                    "match_ratio": len(matched_peaks) / len(peak_list),
-                }
-            )
+
+        for query_shift, pos in zip(peak_list, first[:, k].tolist()):
+            if pos < no_match:
+                db_entry = peaks[pos - ptr[c]]
+                db_shift = db_entry["avg_shift"]
+                matched_peaks.append(
+                    {
+                        "query_shift": query_shift,
+                        "db_shift": db_shift,
+                        "db_entry": db_entry,
+                        "difference": abs(query_shift - db_shift),
+                    }
+                )
+
+        matches.append(
+            {
+                "structure": structures[c],
+                "all_peaks": peaks,
+                "matched_peaks": matched_peaks,
+                "match_count": len(matched_peaks),
+                "total_peaks": len(peaks),
+                "match_ratio": len(matched_peaks) / len(peak_list),
+            }
+        )
 
     # Sort by number of matches and match ratio
     matches.sort(key=lambda x: (x["match_count"], x["match_ratio"]), reverse=True)
@@ -0,0 +1,165 @@
+"""
+Fast line reader for the nmrshiftdb2 CSV export
+Reads the file as bytes so line and field splitting run in C instead of per-line Python,
+and caches parsed results in a pickle sidecar next to the CSV
+"""
+
+import mmap
+import multiprocessing
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+
+# Bytes split per block (16 MB)
+READ_BLOCK_SIZE = 1 << 24
+
+
+def iter_lines(path, start=0, end=None):
+    """
+    Yield every line of the file as bytes, without the trailing newline
+
+    The file is memory-mapped, so pages are faulted in on demand instead of
+    being copied through read(). It is cut into blocks of about
+    READ_BLOCK_SIZE bytes that end on a newline, and each block is split with
+    bytes.split, which scans with memchr rather than decoding and allocating
+    a str per line.
+
+    start/end restrict the scan to a byte range, which should come from
+    split_line_ranges so that it begins and ends on line boundaries.
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            size = len(mm) if end is None else end
+            while start < size:
+                block_end = start + READ_BLOCK_SIZE
+                if block_end >= size:
+                    # Drop the final newline so it does not yield an empty line
+                    block_end = size - 1 if mm[size - 1] == ord("\n") else size
+                else:
+                    # Cut at the last newline so no line straddles two blocks
+                    cut = mm.rfind(b"\n", start, block_end)
+                    if cut == -1:
+                        cut = mm.find(b"\n", block_end, size)
+                    block_end = size if cut == -1 else cut
+
+                yield from mm[start:block_end].split(b"\n")
+                start = block_end + 1
+
+
+def split_line_ranges(path, num_ranges):
+    """
+    Split the file into up to num_ranges byte ranges that start and end on line boundaries
+
+    Returns:
+        List of (start, end) offsets covering the whole file, for iter_lines
+    """
+    size = os.path.getsize(path)
+    if size == 0:
+        return []
+
+    bounds = [0]
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for i in range(1, num_ranges):
+            newline = mm.find(b"\n", max(size * i // num_ranges, bounds[-1]))
+            if newline == -1:
+                break
+            if newline + 1 > bounds[-1]:
+                bounds.append(newline + 1)
+    if bounds[-1] < size:
+        bounds.append(size)
+
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+@contextmanager
+def map_line_ranges(func, byte_ranges, parallel=True, initializer=None, initargs=()):
+    """
+    Map func over byte ranges from split_line_ranges, in a worker pool when it pays off
+
+    Yields an iterator of func(byte_range) results in range order. The ranges
+    go to a multiprocessing pool of os.cpu_count() workers (each set up with
+    initializer(*initargs)); with parallel=False, a single CPU or a single
+    range, they run inline in this process instead. The pool is shut down on
+    leaving the with block, so an error or interrupt does not leak workers.
+    """
+    workers = os.cpu_count() or 1
+    if not parallel or workers == 1 or len(byte_ranges) < 2:
+        if initializer is not None:
+            initializer(*initargs)
+        yield map(func, byte_ranges)
+        return
+
+    pool = multiprocessing.Pool(workers, initializer, initargs)
+    try:
+        yield pool.imap(func, byte_ranges)
+    finally:
+        # Every result has been consumed unless the caller failed, so this
+        # only cuts work short on an error or interrupt
+        pool.terminate()
+        pool.join()
+
+
+def _sidecar_path(csv_path, name):
+    return f"{os.path.splitext(csv_path)[0]}.{name}.pickle"
+
+
+def _fingerprint(csv_path, key):
+    stat = os.stat(csv_path)
+    return (stat.st_size, stat.st_mtime_ns, key)
+
+
+def load_sidecar(csv_path, name, key=None):
+    """
+    Load parsed data cached next to the CSV by save_sidecar
+
+    Returns None when there is no sidecar, when it cannot be read (truncated,
+    or pickled from code that has since changed), or when it was written for
+    a different version of the CSV (size/mtime) or a different key.
+    """
+    path = _sidecar_path(csv_path, name)
+    try:
+        with open(path, "rb") as f:
+            cached = pickle.load(f)
+        fingerprint = _fingerprint(csv_path, key)
+    except Exception:
+        return None
+
+    if not isinstance(cached, dict) or cached.get("fingerprint") != fingerprint:
+        return None
+    return cached.get("data")
+
+
+def save_sidecar(csv_path, name, data, key=None):
+    """
+    Cache parsed data next to the CSV, tagged with the CSV's size and mtime
+
+    key distinguishes variants of the same parse (e.g. a max_entries limit).
+    The pickle is written to a temporary file and renamed into place, so
+    readers never see a partial sidecar. Returns the sidecar path, or None
+    if it could not be written (the data is then simply not cached).
+    """
+    path = _sidecar_path(csv_path, name)
+    tmp_path = None
+    try:
+        fd, tmp_path = tempfile.mkstemp(
+            dir=os.path.dirname(path) or ".", prefix=os.path.basename(path), suffix=".tmp"
+        )
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(
+                {"fingerprint": _fingerprint(csv_path, key), "data": data},
+                f,
+                protocol=pickle.HIGHEST_PROTOCOL,
+            )
+        os.replace(tmp_path, path)
+    except OSError:
+        if tmp_path is not None:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+        return None
+    return path
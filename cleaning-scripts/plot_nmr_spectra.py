@@ -85,13 +85,12 @@ for idx, (structure, peaks) in enumerate(interesting_compounds):
 
     # Create a simulated NMR spectrum
     ppm_range = np.linspace(min(shifts) - 20, max(shifts) + 20, 2000)
-    spectrum = np.zeros_like(ppm_range)
 
-    # Add Lorentzian peaks
-    for shift, intensity in zip(shifts, intensities):
-        # Lorentzian line shape
-        width = 2.0  # Peak width
-        spectrum += intensity / (1 + ((ppm_range - shift) / width)**2)
+    # Add Lorentzian peaks, all at once: one (peaks x points) broadcast
+    # summed over the peaks
+    width = 2.0  # Peak width
+    diff = (ppm_range[None, :] - np.asarray(shifts)[:, None]) / width
+    spectrum = (np.asarray(intensities)[:, None] / (1.0 + diff * diff)).sum(axis=0)
 
     # Plot
     ax.plot(ppm_range, spectrum, 'b-', linewidth=1)
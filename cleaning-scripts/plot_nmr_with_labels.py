@@ -2,67 +2,71 @@ import pandas as pd
 import matplotlib.pyplot as plt
 import numpy as np
 from collections import defaultdict
+from itertools import islice
 import re
 from hose_decoder import decode_hose_code, describe_environment
+from nmrshiftdb_reader import iter_lines
 
-# Read the NMR database
-print("Reading NMR database...")
-data = []
-with open('nmrshiftdb2/nmrshiftdb.csv', 'r', encoding='utf-8') as f:
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
-        data.append(line)
-
-print(f"Total entries: {len(data)}")
-
-# Parse the data
-parsed_data = []
-for entry in data[:20000]:  # Parse first 20000 entries for better variety
+# Entries parsed from the head of the database (enough for variety)
+PARSE_LIMIT = 20000
+
+
+def parse_entry(entry):
+    """Parse one raw (bytes) database line into an entry dict, or None if it is malformed"""
     try:
-        # Split by underscore to get components
-        parts = entry.split('_')
-        if len(parts) >= 4:
-            solvent = parts[0]
-            nucleus_info = parts[1]
-            structure = parts[2]
+        # Split the raw line by underscore once: solvent, nucleus, structure,
+        # then the four shift fields (parsed straight from bytes, so only
+        # the text fields are decoded)
+        parts = entry.split(b'_')
+        if len(parts) >= 7:
+            solvent = parts[0].decode('utf-8')
+            nucleus_info = parts[1].decode('utf-8')
+            structure = parts[2].decode('utf-8')
 
             # Extract chemical shifts
-            shift_parts = parts[3:]
-            shift_str = '_'.join(shift_parts)
-            shift_values = shift_str.split('_')
-
-            if len(shift_values) >= 4:
-                min_shift = float(shift_values[0])
-                max_shift = float(shift_values[1])
-                avg_shift = float(shift_values[2])
-                count = int(shift_values[3])
-
-                # Extract HOSE code (after the semicolon)
-                hose_code = ""
-                if ';' in structure:
-                    hose_code = structure.split(';')[1] if len(structure.split(';')) > 1 else ""
-
-                parsed_data.append({
-                    'solvent': solvent,
-                    'nucleus': nucleus_info,
-                    'structure': structure,
-                    'hose_code': hose_code,
-                    'min_shift': min_shift,
-                    'max_shift': max_shift,
-                    'avg_shift': avg_shift,
-                    'count': count
-                })
+            min_shift = float(parts[3])
+            max_shift = float(parts[4])
+            avg_shift = float(parts[5])
+            count = int(parts[6])
+
+            # Extract HOSE code (second ';'-separated field, splitting once)
+            hose_code = ""
+            if ';' in structure:
+                hose_code = structure.split(';', 2)[1]
+
+            return {
+                'solvent': solvent,
+                'nucleus': nucleus_info,
+                'structure': structure,
+                'hose_code': hose_code,
+                'min_shift': min_shift,
+                'max_shift': max_shift,
+                'avg_shift': avg_shift,
+                'count': count
+            }
     except Exception as e:
-        continue
+        pass
+    return None
+
 
-print(f"Successfully parsed: {len(parsed_data)} entries")
+# Read the NMR database lazily: lines stream from the memory map, only the
+# first PARSE_LIMIT are kept for parsing and the rest are just counted
+print("Reading NMR database...")
+lines = (line for line in (raw.strip() for raw in iter_lines('nmrshiftdb2/nmrshiftdb.csv')) if line)
+head = list(islice(lines, PARSE_LIMIT))
+total_entries = len(head) + sum(1 for _ in lines)
+
+print(f"Total entries: {total_entries}")
 
-# Group spectra by structure (compound)
+# Parse the data, grouping spectra by structure (compound) as they are parsed
+parsed_count = 0
 compounds = defaultdict(list)
-for entry in parsed_data:
-    compounds[entry['structure']].append(entry)
+for entry in map(parse_entry, head):
+    if entry is not None:
+        parsed_count += 1
+        compounds[entry['structure']].append(entry)
+
+print(f"Successfully parsed: {parsed_count} entries")
 
 # Select diverse compounds with multiple peaks
 interesting_compounds = []
@@ -103,13 +107,12 @@ for idx, (structure, peaks) in enumerate(interesting_compounds):
 
     # Create a simulated NMR spectrum
     ppm_range = np.linspace(min(shifts) - 20, max(shifts) + 20, 2000)
-    spectrum = np.zeros_like(ppm_range)
 
-    # Add Lorentzian peaks
-    for shift, intensity in zip(shifts, intensities):
-        # Lorentzian line shape
-        width = 1.5  # Peak width
-        spectrum += intensity / (1 + ((ppm_range - shift) / width)**2)
+    # Add Lorentzian peaks, all at once: one (peaks x points) broadcast
+    # summed over the peaks
+    width = 1.5  # Peak width
+    diff = (ppm_range[None, :] - np.asarray(shifts)[:, None]) / width
+    spectrum = (np.asarray(intensities)[:, None] / (1.0 + diff * diff)).sum(axis=0)
 
     # Plot
     ax.plot(ppm_range, spectrum, 'b-', linewidth=1.2)
@@ -14,57 +14,97 @@ Usage:
 """
 
 import json
+import os
 import sys
 import time
+from functools import lru_cache, partial
 from hose_to_smiles import hose_to_smiles, extract_central_atom
+from nmrshiftdb_reader import (
+    iter_lines,
+    load_sidecar,
+    map_line_ranges,
+    save_sidecar,
+    split_line_ranges,
+)
 
+# Output file buffer (1 MB), so the streamed entries are written in large blocks
+WRITE_BUFFER_SIZE = 1 << 20
 
-def parse_line(line):
-    """Parse a database line into its components.
+# Entries copied into the pretty-printed sample file
+SAMPLE_SIZE = 50
 
-    Format: Solvent_Nucleus;HOSE_min_max_avg_count
+# Line counters kept while aggregating, summed across byte ranges
+STAT_NAMES = ("total", "parsed", "converted", "failed_parse", "failed_convert", "skipped_no_hose")
 
-    The tricky part: solvent names can contain underscores.
-    Strategy:
-      1. rsplit on '_' with maxsplit=4 to peel off the 4 numeric fields
-      2. Split the front on ';' to separate Solvent_Nucleus from HOSE code
-      3. rsplit the before-semicolon part on '_' with maxsplit=1 for nucleus
-    """
-    line = line.strip()
-    if not line:
-        return None
+# Bytes per aggregated range (8 MB). The ranges depend only on the file, not
+# on the CPU count, so the per-range shift sums (and so the rounded averages)
+# come out the same on every machine
+RANGE_SIZE = 1 << 23
 
+# Bump when hose_to_smiles output changes so stale SMILES sidecars are ignored
+SMILES_CACHE_VERSION = 1
+
+# (hose_code, central_atom) -> SMILES from earlier runs, set per process
+# by _init_smiles_cache
+_smiles_cache = {}
+
+
+def _split_fields(line, underscore, semicolon):
+    """Split a stripped database line (str or bytes) into its fields.
+
+    underscore and semicolon are the separators in the line's own type, so
+    the worker loop can split raw mmap bytes without decoding them.
+
+    Returns:
+        (solvent, nucleus, hose_code, min_shift, max_shift, avg_shift, count)
+        or None if the line is malformed
+    """
     # Step 1: peel off the 4 numeric fields from the right
-    parts = line.rsplit("_", 4)
+    parts = line.rsplit(underscore, 4)
     if len(parts) < 5:
         return None
 
-    front = parts[0]
+    front, min_str, max_str, avg_str, count_str = parts
     try:
-        min_shift = float(parts[1])
-        max_shift = float(parts[2])
-        avg_shift = float(parts[3])
-        count = int(parts[4])
-    except (ValueError, IndexError):
+        min_shift = float(min_str)
+        max_shift = float(max_str)
+        avg_shift = float(avg_str)
+        count = int(count_str)
+    except ValueError:
         return None
 
     # Step 2: split on ';' to get HOSE code
-    if ";" not in front:
+    before_semi, semi, hose_code = front.partition(semicolon)
+    if not semi:
         return None
 
-    semi_pos = front.index(";")
-    before_semi = front[:semi_pos]
-    hose_code = front[semi_pos + 1:]
-
     # Step 3: last underscore-delimited field before ';' is the nucleus
-    nuc_parts = before_semi.rsplit("_", 1)
-    if len(nuc_parts) == 2:
-        solvent = nuc_parts[0]
-        nucleus = nuc_parts[1]
-    else:
-        solvent = ""
-        nucleus = nuc_parts[0]
+    # (no underscore leaves solvent empty)
+    solvent, _, nucleus = before_semi.rpartition(underscore)
+
+    return solvent, nucleus, hose_code, min_shift, max_shift, avg_shift, count
+
+
+def parse_line(line):
+    """Parse a database line into its components.
+
+    Format: Solvent_Nucleus;HOSE_min_max_avg_count
+
+    The tricky part: solvent names can contain underscores.
+    Strategy (each step a single C-level split returning fixed fields):
+      1. rsplit on '_' with maxsplit=4 to peel off the 4 numeric fields
+      2. partition the front on the first ';' to separate Solvent_Nucleus from HOSE code
+      3. rpartition the before-semicolon part on the last '_' for nucleus
+    """
+    line = line.strip()
+    if not line:
+        return None
+
+    fields = _split_fields(line, "_", ";")
+    if fields is None:
+        return None
 
+    solvent, nucleus, hose_code, min_shift, max_shift, avg_shift, count = fields
     return {
         "solvent": solvent,
         "nucleus": nucleus,
@@ -76,6 +116,7 @@ def parse_line(line):
     }
 
 
+@lru_cache(maxsize=None)
 def get_central_atom(nucleus_str):
     """Extract central atom symbol from nucleus string.
     Examples: 'C-4' -> 'C', 'C-3-6' -> 'C', 'H-1' -> 'H', 'N-15' -> 'N'
@@ -86,128 +127,226 @@ def get_central_atom(nucleus_str):
     return atom if atom else "C"
 
 
+def _init_smiles_cache(smiles_cache):
+    """Install the SMILES conversions of earlier runs (pool initializer)."""
+    global _smiles_cache
+    _smiles_cache = smiles_cache
+
+
+def _aggregate_range(db_path, byte_range, max_lines=None):
+    """Parse and aggregate the CSV lines in one byte range (runs in a worker process).
+
+    Returns:
+        (lookup, stats) where lookup maps hose_code -> {"n": nucleus,
+        "s": smiles, solvent: [min, max, sum, cnt]} in first-seen order and
+        stats maps each name in STAT_NAMES to its line count
+    """
+    stats = dict.fromkeys(STAT_NAMES, 0)
+
+    # Keyed by the raw HOSE bytes of the mmap line: rows are split and
+    # looked up without decoding, and a code's text is decoded only the
+    # first time it is seen (kept in canonical under the same key)
+    lookup = {}
+    canonical = {}
+
+    # Decoded solvent names keyed by their raw bytes (a handful of values)
+    solvents = {}
+
+    for idx, raw_line in enumerate(iter_lines(db_path, *byte_range)):
+        if max_lines and idx >= max_lines:
+            break
+
+        stats["total"] += 1
+        line = raw_line.strip()
+        fields = _split_fields(line, b"_", b";") if line else None
+
+        if fields is None:
+            stats["failed_parse"] += 1
+            continue
+
+        stats["parsed"] += 1
+        solvent_key, nucleus, hose_key, min_shift, max_shift, avg_shift, count = fields
+
+        if not hose_key:
+            stats["skipped_no_hose"] += 1
+            continue
+
+        # The record is looked up once per row and then worked on through
+        # a local, since every lookup re-compares the full (often 100+ char)
+        # code against the key
+        record = lookup.get(hose_key)
+        if record is None:
+            hose = hose_key.decode("utf-8")
+            central = get_central_atom(nucleus.decode("utf-8"))
+            smiles = _smiles_cache.get((hose, central))
+            if smiles is None:
+                smiles = hose_to_smiles(hose, central)
+            if smiles is None:
+                stats["failed_convert"] += 1
+                continue
+            record = lookup[hose_key] = {"n": central, "s": smiles}
+            canonical[hose_key] = hose
+
+        stats["converted"] += 1
+        solvent = solvents.get(solvent_key)
+        if solvent is None:
+            solvent = solvents[solvent_key] = solvent_key.decode("utf-8")
+        rec = record.get(solvent)
+        if rec is None:
+            # A plain [min, max, sum, cnt] list: index access and inline
+            # comparisons instead of string-keyed lookups and min()/max() calls
+            record[solvent] = [min_shift, max_shift, avg_shift * count, count]
+        else:
+            if min_shift < rec[0]:
+                rec[0] = min_shift
+            if max_shift > rec[1]:
+                rec[1] = max_shift
+            rec[2] += avg_shift * count
+            rec[3] += count
+
+    # Hand back text keys (one pass over the unique codes, not the rows)
+    return {canonical[hose_key]: record for hose_key, record in lookup.items()}, stats
+
+
+def _merge_lookup(lookup, partial_lookup):
+    """Merge a later byte range's partial lookup into lookup, keeping first-seen order."""
+    for hose, partial_record in partial_lookup.items():
+        record = lookup.get(hose)
+        if record is None:
+            lookup[hose] = partial_record
+            continue
+
+        for solvent, partial_rec in partial_record.items():
+            if solvent in ("n", "s"):
+                continue
+            rec = record.get(solvent)
+            if rec is None:
+                record[solvent] = partial_rec
+            else:
+                if partial_rec[0] < rec[0]:
+                    rec[0] = partial_rec[0]
+                if partial_rec[1] > rec[1]:
+                    rec[1] = partial_rec[1]
+                rec[2] += partial_rec[2]
+                rec[3] += partial_rec[3]
+
+
 def preprocess(max_entries=None, db_path="../nmrshiftdb2/nmrshiftdb.csv"):
-    """Process the database and build a HOSE->shift lookup table with SMILES."""
+    """Process the database and build a HOSE->shift lookup table with SMILES.
+
+    A full run splits the file into newline-aligned byte ranges of about
+    RANGE_SIZE bytes, aggregates them in a multiprocessing pool and merges
+    the partial lookups in file order; a max_entries prefix is aggregated as
+    one range, and a single-CPU machine aggregates the same ranges inline."""
     print("NMR Database Preprocessor")
     print("=" * 70)
 
     # Stats
-    total = 0
-    parsed = 0
-    converted = 0
-    failed_parse = 0
-    failed_convert = 0
-    skipped_no_hose = 0
-
-    # Lookup table: hose_code -> {"n": nucleus, "s": smiles, solvent: {min, max, sum, cnt}}
+    stats = dict.fromkeys(STAT_NAMES, 0)
+
+    # Lookup table: hose_code -> {"n": nucleus, "s": smiles, solvent: [min, max, sum, cnt]}
     lookup = {}
 
     start_time = time.time()
 
-    with open(db_path, "r", encoding="utf-8") as f:
-        for idx, line in enumerate(f):
-            if max_entries and idx >= max_entries:
-                break
-
-            total += 1
-            entry = parse_line(line)
-
-            if entry is None:
-                failed_parse += 1
-                continue
+    # HOSE codes converted by earlier runs over this CSV are not converted again
+    smiles_cache = load_sidecar(db_path, "smiles", key=SMILES_CACHE_VERSION) or {}
 
-            parsed += 1
-            hose = entry["hose_code"]
+    if max_entries:
+        byte_ranges = split_line_ranges(db_path, 1)
+    else:
+        byte_ranges = split_line_ranges(db_path, -(-os.path.getsize(db_path) // RANGE_SIZE))
+    aggregate = partial(_aggregate_range, db_path, max_lines=max_entries)
+
+    with map_line_ranges(
+        aggregate,
+        byte_ranges,
+        parallel=not max_entries,
+        initializer=_init_smiles_cache,
+        initargs=(smiles_cache,),
+    ) as results:
+        for partial_lookup, range_stats in results:
+            _merge_lookup(lookup, partial_lookup)
+            for name in STAT_NAMES:
+                stats[name] += range_stats[name]
 
-            if not hose:
-                skipped_no_hose += 1
-                continue
+            # Progress reporting
+            elapsed = time.time() - start_time
+            rate = stats["total"] / elapsed if elapsed > 0 else 0
+            print(
+                f"  Processed {stats['total']:,} lines "
+                f"({stats['converted']:,} converted, "
+                f"{stats['failed_parse'] + stats['failed_convert']:,} failed) "
+                f"[{rate:.0f} lines/sec]"
+            )
 
-            central = get_central_atom(entry["nucleus"])
+    elapsed = time.time() - start_time
 
-            # Use HOSE code as the primary key
-            key = hose
-            if key not in lookup:
-                smiles = hose_to_smiles(hose, central)
-                if smiles is None:
-                    failed_convert += 1
+    # Finalize (sum -> avg, round values) while writing, so the lookup is
+    # walked only once: each solvent group is swapped for its final record,
+    # the run's conversions are collected for the SMILES sidecar, and each
+    # entry goes through the C encoder on its own and into a large write
+    # buffer instead of one json.dump over the whole dict
+    output_path = "hose_shift_lookup.json"
+    encode = json.JSONEncoder(separators=(",", ":")).encode
+    sample = {}
+    total_solvent_entries = 0
+    cached_count = len(smiles_cache)
+    with open(output_path, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write("{")
+        for idx, (hose_key, entry) in enumerate(lookup.items()):
+            for k, v in entry.items():
+                if k in ("n", "s"):
                     continue
-                lookup[key] = {"n": central, "s": smiles}
-
-            converted += 1
-            solvent = entry["solvent"]
-            if solvent not in lookup[key]:
-                lookup[key][solvent] = {
-                    "min": entry["min_shift"],
-                    "max": entry["max_shift"],
-                    "sum": entry["avg_shift"] * entry["count"],
-                    "cnt": entry["count"],
+                min_shift, max_shift, total, cnt = v
+                entry[k] = {
+                    "min": round(min_shift, 4),
+                    "max": round(max_shift, 4),
+                    "cnt": cnt,
+                    "avg": round(total / cnt, 4) if cnt > 0 else 0,
                 }
-            else:
-                rec = lookup[key][solvent]
-                rec["min"] = min(rec["min"], entry["min_shift"])
-                rec["max"] = max(rec["max"], entry["max_shift"])
-                rec["sum"] += entry["avg_shift"] * entry["count"]
-                rec["cnt"] += entry["count"]
-
-            # Progress reporting
-            if total % 100000 == 0:
-                elapsed = time.time() - start_time
-                rate = total / elapsed if elapsed > 0 else 0
-                print(
-                    f"  Processed {total:,} lines "
-                    f"({converted:,} converted, {failed_parse + failed_convert:,} failed) "
-                    f"[{rate:.0f} lines/sec]"
-                )
+                total_solvent_entries += 1
+            smiles_cache[hose_key, entry["n"]] = entry["s"]
 
-    elapsed = time.time() - start_time
+            if idx:
+                f.write(",")
+            f.write(encode(hose_key))
+            f.write(":")
+            f.write(encode(entry))
 
-    # Finalize: convert sum -> avg, round values
-    for hose_key, entry in lookup.items():
-        for k, v in entry.items():
-            if k in ("n", "s"):
-                continue
-            v["avg"] = round(v["sum"] / v["cnt"], 4) if v["cnt"] > 0 else 0
-            v["min"] = round(v["min"], 4)
-            v["max"] = round(v["max"], 4)
-            del v["sum"]
+            # Pretty-printed sample for inspection
+            if idx < SAMPLE_SIZE:
+                sample[hose_key] = entry
+        f.write("}")
 
-    # Write output
-    output_path = "hose_shift_lookup.json"
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(lookup, f, separators=(",", ":"))
+    # Remember this run's conversions
+    if len(smiles_cache) > cached_count:
+        save_sidecar(db_path, "smiles", smiles_cache, key=SMILES_CACHE_VERSION)
 
-    # Pretty-printed sample for inspection
     sample_path = "hose_shift_sample.json"
-    sample_keys = list(lookup.keys())[:50]
-    sample = {k: lookup[k] for k in sample_keys}
     with open(sample_path, "w", encoding="utf-8") as f:
         json.dump(sample, f, indent=2)
 
-    # Stats
-    total_solvent_entries = sum(
-        sum(1 for k in v if k not in ("n", "s"))
-        for v in lookup.values()
-    )
-
     # Report
     print()
     print("=" * 70)
     print("RESULTS")
     print("=" * 70)
-    print(f"  Total lines:         {total:,}")
-    print(f"  Parsed successfully: {parsed:,}")
-    print(f"  Converted to SMILES: {converted:,}")
-    print(f"  Failed (parse):      {failed_parse:,}")
-    print(f"  Failed (convert):    {failed_convert:,}")
-    print(f"  No HOSE code:        {skipped_no_hose:,}")
+    print(f"  Total lines:         {stats['total']:,}")
+    print(f"  Parsed successfully: {stats['parsed']:,}")
+    print(f"  Converted to SMILES: {stats['converted']:,}")
+    print(f"  Failed (parse):      {stats['failed_parse']:,}")
+    print(f"  Failed (convert):    {stats['failed_convert']:,}")
+    print(f"  No HOSE code:        {stats['skipped_no_hose']:,}")
     print(f"  Unique HOSE keys:    {len(lookup):,}")
     print(f"  Solvent groups:      {total_solvent_entries:,}")
     print(f"  Time elapsed:        {elapsed:.1f} sec")
     print(f"  Output:              {output_path}")
     print(f"  Sample:              {sample_path}")
 
-    conversion_rate = converted / parsed * 100 if parsed > 0 else 0
+    conversion_rate = (
+        stats["converted"] / stats["parsed"] * 100 if stats["parsed"] > 0 else 0
+    )
     print(f"  Conversion rate:     {conversion_rate:.1f}%")
 
     return lookup
@@ -0,0 +1,121 @@
+"""
+Tests for the overlapping-range finder.
+Validates the tiled sweep, duplicate-range collapsing and grouping against
+a brute-force containment check.
+"""
+
+import random
+
+import numpy as np
+
+import find_overlaps
+from find_overlaps import (
+    dedup_ranges,
+    expand_duplicates,
+    find_overlapping_ranges,
+    group_overlaps,
+)
+
+
+def brute_force(mins, maxs, tolerance=0.0):
+    """Compare every pair directly; returns (pair_count, groups)."""
+    pairs = []
+    for i in range(len(mins)):
+        for j in range(i + 1, len(mins)):
+            lo1, hi1 = mins[i] - tolerance, maxs[i] + tolerance
+            lo2, hi2 = mins[j] - tolerance, maxs[j] + tolerance
+            if (lo1 <= lo2 and hi1 >= hi2) or (lo2 <= lo1 and hi2 >= hi1):
+                pairs.append((i, j))
+
+    # Connected components of the pair graph
+    parent = {}
+
+    def find(node):
+        while parent.setdefault(node, node) != node:
+            node = parent[node]
+        return node
+
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+    components = {}
+    for node in list(parent):
+        components.setdefault(find(node), set()).add(node)
+    return len(pairs), components.values()
+
+
+def find_groups(mins, maxs, tolerance=0.0):
+    """Run the same pipeline as the script; returns (pair_count, groups)."""
+    mins = np.array(mins, dtype=np.float64)
+    maxs = np.array(maxs, dtype=np.float64)
+    representatives, range_class = dedup_ranges(mins, maxs)
+    overlaps = find_overlapping_ranges(
+        mins[representatives], maxs[representatives], tolerance=tolerance
+    )
+    multiplicity = np.bincount(range_class).tolist()
+    groups, pair_count = group_overlaps(overlaps, weights=multiplicity)
+    groups, duplicate_pairs = expand_duplicates(groups, range_class)
+    return pair_count + duplicate_pairs, groups
+
+
+def assert_matches_brute_force(mins, maxs, tolerance=0.0):
+    expected_count, expected_groups = brute_force(mins, maxs, tolerance)
+    pair_count, groups = find_groups(mins, maxs, tolerance)
+    assert pair_count == expected_count
+    assert sorted(map(sorted, groups)) == sorted(map(sorted, expected_groups))
+
+
+def test_small_ranges():
+    """Test nesting, partial overlaps and duplicated ranges."""
+    mins = [1.0, 1.5, 2.0, 1.0, 5.0, 5.0, 5.0, 4.0, 9.0]
+    maxs = [3.0, 2.5, 4.0, 3.0, 6.0, 6.0, 6.0, 4.5, 9.5]
+    assert_matches_brute_force(mins, maxs)
+    assert_matches_brute_force(mins, maxs, tolerance=0.5)
+
+    # Only duplicates of one range: a group of their own
+    pair_count, groups = find_groups([2.0, 2.0, 2.0], [3.0, 3.0, 3.0])
+    assert pair_count == 3
+    assert [sorted(g) for g in groups] == [[0, 1, 2]]
+
+    print("  small ranges: PASS")
+
+
+def test_tile_boundaries():
+    """Test ties in min and max shift spread across several small tiles."""
+    tile_size = find_overlaps.TILE_SIZE
+    find_overlaps.TILE_SIZE = 4
+    try:
+        # Coarse values so equal mins, equal maxs and duplicates straddle tiles
+        rng = random.Random(0)
+        for _ in range(20):
+            n = rng.randint(1, 40)
+            mins = [rng.randint(0, 6) / 2 for _ in range(n)]
+            maxs = [lo + rng.randint(0, 4) / 2 for lo in mins]
+            assert_matches_brute_force(mins, maxs)
+
+        # A long run of identical mins with distinct maxs
+        mins = [1.0] * 11
+        maxs = [2.0 + k % 5 for k in range(11)]
+        assert_matches_brute_force(mins, maxs)
+    finally:
+        find_overlaps.TILE_SIZE = tile_size
+
+    print("  tile boundaries: PASS")
+
+
+def test_empty_input():
+    """Test that no entries give no pairs and no groups."""
+    pair_count, groups = find_groups([], [])
+    assert pair_count == 0
+    assert groups == []
+
+    print("  empty input: PASS")
+
+
+if __name__ == "__main__":
+    print("Overlapping Range Finder Tests")
+    print("=" * 50)
+    test_small_ranges()
+    test_tile_boundaries()
+    test_empty_input()
+    print()
+    print("ALL TESTS PASSED")
@@ -5,47 +5,61 @@ Validates the tokenizer, parser, tree builder, and SMILES serializer.
 
 from hose_to_smiles import (
     tokenize,
+    tokenize_many,
     parse_hose,
     hose_to_smiles,
     extract_central_atom,
     tree_to_smiles,
     _find_ring_pairs,
+    TOKEN_NAMES,
+    TOK_ATOM,
+    TOK_AROMATIC,
+    TOK_CHARGE_POS,
+    TOK_RING,
 )
 from preprocess_database import parse_line
 
 
 def test_tokenizer():
     """Test that the tokenizer produces correct token sequences."""
-    tokens = tokenize("HHHC")
-    assert len(tokens) == 4
-    assert all(t.type == "ATOM" for t in tokens)
-    assert [t.value for t in tokens] == ["H", "H", "H", "C"]
-
-    tokens = tokenize("=CC")
-    assert tokens[0].type == "DOUBLE"
-    assert tokens[1].type == "ATOM" and tokens[1].value == "C"
-    assert tokens[2].type == "ATOM" and tokens[2].value == "C"
-
-    tokens = tokenize("*C*C")
-    assert tokens[0].type == "AROMATIC"
-    assert tokens[1].value == "C"
-    assert tokens[2].type == "AROMATIC"
-    assert tokens[3].value == "C"
+    def names(types):
+        return [TOKEN_NAMES[t] for t in types]
+
+    types, values = tokenize("HHHC")
+    assert len(types) == 4
+    assert all(name == "ATOM" for name in names(types))
+    assert values == ["H", "H", "H", "C"]
+
+    types, values = tokenize("=CC")
+    assert names(types) == ["DOUBLE", "ATOM", "ATOM"]
+    assert values[1] == "C" and values[2] == "C"
+
+    types, values = tokenize("*C*C")
+    assert types[0] == TOK_AROMATIC
+    assert values[1] == "C"
+    assert types[2] == TOK_AROMATIC
+    assert values[3] == "C"
 
     # Bremser substitutions
-    tokens = tokenize("XYQ")
-    assert [t.value for t in tokens] == ["Cl", "Br", "Si"]
+    types, values = tokenize("XYQ")
+    assert values == ["Cl", "Br", "Si"]
 
     # Charges
-    tokens = tokenize("N+")
-    assert tokens[0].type == "ATOM" and tokens[0].value == "N"
-    assert tokens[1].type == "CHARGE_POS"
+    types, values = tokenize("N+")
+    assert types[0] == TOK_ATOM and values[0] == "N"
+    assert types[1] == TOK_CHARGE_POS
+    assert values[1] is None
 
     # Ring closure
-    tokens = tokenize("@HC")
-    assert tokens[0].type == "RING"
-    assert tokens[1].value == "H"
-    assert tokens[2].value == "C"
+    types, values = tokenize("@HC")
+    assert types[0] == TOK_RING
+    assert values[1] == "H"
+    assert values[2] == "C"
+
+    # Batch tokenizer matches the single-code one
+    codes = ["HHHC", "", "*C*C(=OO/H,H)", "N+C/", "xyz12", "XYQ"]
+    assert tokenize_many(codes) == [tokenize(code) for code in codes]
+    assert tokenize_many([]) == []
 
     print("  tokenizer: PASS")
 
@@ -128,6 +142,11 @@ def test_empty_and_edge_cases():
     s = hose_to_smiles("HHHC/", "C")
     assert s is not None
 
+    # Malformed structure (branch separator in sphere 0, nested parens)
+    assert hose_to_smiles("HH,C(C)", "C") is None
+    assert hose_to_smiles("C(C(C)", "C") is None
+    assert hose_to_smiles("C(C)C(", "C") is None
+
     print("  edge cases: PASS")
 
 
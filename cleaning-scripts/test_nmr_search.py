@@ -0,0 +1,149 @@
+"""
+Tests for the NMR database search.
+Validates shift searches against list and columnar databases.
+"""
+
+import random
+
+import numpy as np
+
+from nmr_search import ShiftDatabase, search_by_peak_list, search_by_shift
+
+
+def make_entry(avg_shift, structure="C-4;HHHC(//)", count=1):
+    return {
+        "solvent": "C",
+        "nucleus": "Unreported",
+        "structure": structure,
+        "hose_code": structure.split(";")[1],
+        "min_shift": avg_shift,
+        "max_shift": avg_shift,
+        "avg_shift": avg_shift,
+        "count": count,
+    }
+
+
+def make_database(entries):
+    """Build the columnar ShiftDatabase holding the same entries."""
+    return ShiftDatabase(
+        [e["solvent"] for e in entries],
+        [e["nucleus"] for e in entries],
+        [e["structure"] for e in entries],
+        np.array([e["min_shift"] for e in entries], dtype=np.float64),
+        np.array([e["max_shift"] for e in entries], dtype=np.float64),
+        np.array([e["avg_shift"] for e in entries], dtype=np.float64),
+        np.array([e["count"] for e in entries], dtype=np.int64),
+    )
+
+
+def brute_force_peak_list(entries, peak_list, tolerance, min_matches):
+    """Match every query peak against each compound's peaks in database order."""
+    compounds = {}
+    for entry in entries:
+        compounds.setdefault(entry["structure"], []).append(entry)
+
+    matches = []
+    for structure, peaks in compounds.items():
+        matched = []
+        for query_shift in peak_list:
+            for peak in peaks:
+                if abs(query_shift - peak["avg_shift"]) <= tolerance:
+                    matched.append((query_shift, peak["count"]))
+                    break
+        if len(matched) >= min_matches:
+            matches.append((structure, len(peaks), matched))
+    matches.sort(key=lambda m: len(m[2]), reverse=True)
+    return matches
+
+
+def summarize(results):
+    """Reduce peak-list results to (structure, total_peaks, matched) tuples."""
+    return [
+        (
+            r["structure"],
+            r["total_peaks"],
+            [(m["query_shift"], m["db_entry"]["count"]) for m in r["matched_peaks"]],
+        )
+        for r in results
+    ]
+
+
+def test_search_duplicate_edge_shifts():
+    """Test that every repeated shift at the window edge is matched."""
+    shifts = [0.3, 0.3, 0.3, 1.0, 1.7, 1.7]
+    entries = [make_entry(shift) for shift in shifts]
+    database = make_database(entries)
+
+    for db in (entries, database):
+        results = search_by_shift(db, 1.0, tolerance=0.7)
+        assert len(results) == 6
+        assert results[0]["avg_shift"] == 1.0
+
+    print("  duplicate edge shifts: PASS")
+
+
+def test_search_by_peak_list():
+    """Test first-match-per-compound in database order and repeated queries."""
+    # count tags each peak so the matched entry can be identified
+    entries = [
+        make_entry(10.3, "C-4;A", 0),
+        make_entry(50.0, "C-4;B", 1),
+        make_entry(10.0, "C-4;A", 2),
+        make_entry(30.0, "C-4;A", 3),
+        make_entry(10.1, "C-4;B", 4),
+        make_entry(90.0, "C-4;C", 5),
+    ]
+    database = make_database(entries)
+
+    for db in (entries, database):
+        # Both 10.3 and 10.0 match 10.0; the first in database order wins
+        results = search_by_peak_list(db, [10.0, 30.0], tolerance=0.5, min_matches=2)
+        assert summarize(results) == [("C-4;A", 3, [(10.0, 0), (30.0, 3)])]
+
+        # A repeated query peak matches (and counts) once per occurrence
+        results = search_by_peak_list(db, [10.0, 10.0], tolerance=0.5, min_matches=2)
+        assert [r["structure"] for r in results] == ["C-4;A", "C-4;B"]
+        assert summarize(results)[1] == ("C-4;B", 2, [(10.0, 4), (10.0, 4)])
+
+        # min_matches=0 keeps compounds without any matching peak
+        results = search_by_peak_list(db, [50.0], tolerance=0.5, min_matches=0)
+        assert summarize(results) == [
+            ("C-4;B", 2, [(50.0, 1)]),
+            ("C-4;A", 3, []),
+            ("C-4;C", 1, []),
+        ]
+
+    print("  peak list search: PASS")
+
+
+def test_peak_list_matches_brute_force():
+    """Test list and ShiftDatabase input against a per-compound scan."""
+    rng = random.Random(0)
+    entries = [
+        make_entry(rng.randint(0, 40) / 4, f"C-4;{rng.choice('ABCDEFG')}", idx)
+        for idx in range(200)
+    ]
+    database = make_database(entries)
+
+    for _ in range(50):
+        peak_list = [rng.randint(0, 40) / 4 for _ in range(rng.randint(1, 5))]
+        tolerance = rng.choice([0.0, 0.25, 0.5])
+        min_matches = rng.randint(0, 3)
+        expected = brute_force_peak_list(entries, peak_list, tolerance, min_matches)
+        from_list = summarize(search_by_peak_list(entries, peak_list, tolerance, min_matches))
+        from_database = summarize(
+            search_by_peak_list(database, peak_list, tolerance, min_matches)
+        )
+        assert from_list == from_database == expected
+
+    print("  peak list vs brute force: PASS")
+
+
+if __name__ == "__main__":
+    print("NMR Search Tests")
+    print("=" * 50)
+    test_search_duplicate_edge_shifts()
+    test_search_by_peak_list()
+    test_peak_list_matches_brute_force()
+    print()
+    print("ALL TESTS PASSED")